@@ -0,0 +1,64 @@
+"""
+Between dates logs of several generators merged into one time ordered file, run `python backfill.py --help`
+"""
+import os
+import argparse
+
+from common.compression import EXTENSIONS
+from common.partition import PARTITIONS
+from common.registry import GENERATORS, load_generator
+from common.time_profile import SHAPES, parse_shapes
+from common.writer import DEFAULT_BUFFER_SIZE
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Backfill several generators into one file ordered by time')
+    parser.add_argument('-g', '--generators', type=str, help='Comma separated generators to run, evenly mixed',
+                        default=','.join(GENERATORS))
+    parser.add_argument('--mix', type=str, help='Generators and their share of the logs, e.g. aws=40,fortigate=30,'
+                                                'sonicwall=30, replaces --generators')
+    parser.add_argument('-c', '--count', type=int, help='How much logs you want in total, default to 1000000',
+                        default=1000000)
+    parser.add_argument('-s', '--start', type=str, help='Start date from which logs will generate',
+                        default='2011-01-01')
+    parser.add_argument('-e', '--end', type=str, help='End date up to which logs will generate',
+                        default='2020-01-01')
+    parser.add_argument('-o', '--outdir', type=str, help='Output dir for log file', default='destination')
+    parser.add_argument('-n', '--filename', type=str, help='Filename for log file', default='merged.log')
+    parser.add_argument('--echo', action='store_true', help='Print every log to stdout')
+    parser.add_argument('--buffer-size', type=int, help='Size of the chunks written to the log file',
+                        default=DEFAULT_BUFFER_SIZE)
+    parser.add_argument('-z', '--compression', type=str, choices=[name for name in EXTENSIONS if name] + ['none'],
+                        help='Compress the log file while it is generated, default gzip', default='gzip')
+    parser.add_argument('--compress-level', type=int, help='Compression level, default depends on compression')
+    parser.add_argument('--geoip', action='store_true', help='Append the GeoLite location of the source ip to every log')
+    parser.add_argument('--seed', type=int, help='Make the logs reproducible: the same seed and options give the '
+                                                 'same logs')
+    parser.add_argument('--time-profile', type=parse_shapes, default=(),
+                        help='Spread of the logs between dates: uniform, or some of %s comma separated, '
+                             'tuned in setup.cfg' % ', '.join(SHAPES))
+    parser.add_argument('--partition', type=str, choices=sorted(PARTITIONS),
+                        help='Write one file per hour or day under a directory named after the log file, '
+                             'destination/merged/2015/06/01/13.log.gz')
+    parser.add_argument('--max-size', type=float, help='MiB after which a log file goes on in a new one')
+    parser.add_argument('--spool', action='store_true',
+                        help='Write the logs encoded to a spool (destination/merged.spool) for replay.py to send at a '
+                             'high rate, instead of the log file')
+    args = parser.parse_args()
+
+    # numpy is slow to import for --help
+    from common.mix import parse_mix
+    from common.merge import generate_merged, split_count
+    try:
+        mix = parse_mix(args.mix or args.generators)
+    except ValueError as error:
+        parser.error(str(error))
+    generators = [load_generator(name, start=args.start, end=args.end, count=count, outdir=args.outdir,
+                                 locate=args.geoip, seed=args.seed, time_profile=args.time_profile)
+                  for name, count in zip(mix, split_count(args.count, list(mix.values()))) if count]
+    generate_merged(generators, os.path.abspath(os.path.join(args.outdir, args.filename)),
+                    buffer_size=args.buffer_size, compression=None if args.compression == 'none' else args.compression,
+                    level=args.compress_level, echo=args.echo, partition=args.partition,
+                    max_size=int(args.max_size * 1024 * 1024) if args.max_size else None,
+                    spool=args.spool)
@@ -0,0 +1,495 @@
+"""
+Micro benchmarks for the log generators, run `python benchmark.py --help`
+"""
+import os
+import sys
+import json
+import gzip
+import time
+import shutil
+import socket
+import argparse
+import datetime
+import tempfile
+import subprocess
+import contextlib
+import collections
+
+from common.registry import GENERATORS, load_generator
+
+
+def rate(func, count):
+    """
+    Call func count times and return calls per second
+    :param func:
+    :param count:
+    :return:
+    """
+    started = time.perf_counter()
+    for _ in range(count):
+        func()
+    return count / (time.perf_counter() - started)
+
+
+def bench_templates(args):
+    """
+    Lines/sec of the old re.sub chain against the pre-parsed templates used by create_log
+    :param args:
+    :return:
+    """
+    date = datetime.datetime(2020, 1, 1, 12, 30, 45)
+    print('%-12s %14s %14s %8s' % ('generator', 'regex lines/s', 'tmpl lines/s', 'speedup'))
+    for name in args.generators.split(','):
+        generator = load_generator(name)
+
+        def regex_chain():
+            log = generator.get_random_logs(1)[0]
+            log = generator.replace_all_ips(log)
+            log = generator.replace_other(log)
+            log = generator.replace_all_dates(log, date)
+            return log
+
+        before = rate(regex_chain, args.count)
+        after = rate(lambda: generator.create_log(date), args.count)
+        print('%-12s %14.0f %14.0f %7.1fx' % (name, before, after, after / before))
+
+
+def bench_writer(args):
+    """
+    MB/sec of writing pre-generated logs one by one (with print) against LogWriter
+    :param args:
+    :return:
+    """
+    from common.writer import LogWriter
+
+    date = datetime.datetime(2020, 1, 1, 12, 30, 45)
+    print('%-12s %16s %16s %8s' % ('generator', 'per line MB/s', 'buffered MB/s', 'speedup'))
+    for name in args.generators.split(','):
+        generator = load_generator(name)
+        logs = [generator.create_log(date) for _ in range(args.count)]
+        size = sum(len(log.encode('utf-8')) for log in logs) / 1024 / 1024
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, name + '.log')
+
+            started = time.perf_counter()
+            with open(os.devnull, 'w') as null, contextlib.redirect_stdout(null):
+                with open(path, 'wb') as log_file:
+                    for log in logs:
+                        log_file.write(bytes(log, encoding='utf-8'))
+                        print(log)
+            before = time.perf_counter() - started
+
+            started = time.perf_counter()
+            with LogWriter(path) as writer:
+                for log in logs:
+                    writer.write(log)
+            after = time.perf_counter() - started
+
+        print('%-12s %16.1f %16.1f %7.1fx' % (name, size / before, size / after, before / after))
+
+
+def bench_compression(args):
+    """
+    Write then gzip (the old compress) against compressing while writing
+    :param args:
+    :return:
+    """
+    from common.writer import LogWriter
+
+    date = datetime.datetime(2020, 1, 1, 12, 30, 45)
+    print('%-12s %12s %12s %16s %16s' % ('generator', 'two pass s', 'stream s', 'two pass disk MB', 'stream disk MB'))
+    for name in args.generators.split(','):
+        generator = load_generator(name)
+        logs = [generator.create_log(date) for _ in range(args.count)]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, name + '.log')
+
+            started = time.perf_counter()
+            with LogWriter(path) as writer:
+                for log in logs:
+                    writer.write(log)
+            raw = os.path.getsize(path)
+            with open(path, 'rb') as f_in:
+                with gzip.open(path + '.gz', 'wb') as f_out:
+                    shutil.copyfileobj(f_in, f_out)
+            os.remove(path)
+            two_pass = time.perf_counter() - started
+            two_pass_disk = 2 * raw + os.path.getsize(path + '.gz')
+
+            started = time.perf_counter()
+            with LogWriter(path, compression='gzip', level=args.level) as writer:
+                for log in logs:
+                    writer.write(log)
+            stream = time.perf_counter() - started
+            stream_disk = os.path.getsize(writer.path)
+
+        print('%-12s %12.2f %12.2f %16.1f %16.1f' % (name, two_pass, stream, two_pass_disk / 1024 / 1024,
+                                                       stream_disk / 1024 / 1024))
+
+
+def bench_dates(args):
+    """
+    Timestamps/sec of formatting every vendor date per line against BatchFormatter
+    :param args:
+    :return:
+    """
+    from common.time_series import TimeSeries
+    from common.time_format import BatchFormatter
+
+    series = TimeSeries('2011-01-01', '2020-01-01', args.count, chunk_size=args.count)
+    block = next(series.blocks())
+    chunk = next(series.chunks())
+    print('%-12s %16s %16s %8s' % ('generator', 'per line ts/s', 'batch ts/s', 'speedup'))
+    for name in args.generators.split(','):
+        generator = load_generator(name)
+        formatter = BatchFormatter(generator._DATE_FORMATS)
+        formatter.format(block[:1])
+
+        started = time.perf_counter()
+        for date in chunk:
+            generator.format_dates(date)
+        before = args.count / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        formatter.format(block)
+        after = args.count / (time.perf_counter() - started)
+        print('%-12s %16.0f %16.0f %7.1fx' % (name, before, after, after / before))
+
+
+def make_certificate(directory):
+    """
+    Self signed certificate for a local TLS server, None when openssl is not installed
+    :param directory:
+    :return: (certfile, keyfile)
+    """
+    certfile, keyfile = os.path.join(directory, 'cert.pem'), os.path.join(directory, 'key.pem')
+    try:
+        subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj',
+                        '/CN=localhost', '-keyout', keyfile, '-out', certfile], check=True, capture_output=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return certfile, keyfile
+
+
+def bench_sender(args):
+    """
+    Logs/sec sent to a local syslog server: config read and sendto per log (the old forward), a send loop
+    on the connected UDP socket, sendmmsg batches, then TCP with both framings and TLS
+    :param args:
+    :return:
+    """
+    from common.config_reader import ConfigReader
+    from common.sender import UDPSender, StreamSender, get_ssl_context
+    from syslog_server import LoopbackServer
+
+    date = datetime.datetime(2020, 1, 1, 12, 30, 45)
+    config = ConfigReader()
+    methods = ['sendto', 'loop', 'sendmmsg', 'tcp-octet', 'tcp-newline', 'tls']
+    with tempfile.TemporaryDirectory() as tmp:
+        certfile, keyfile = make_certificate(tmp) or (None, None)
+        if certfile is None:
+            methods.remove('tls')
+        print('%-12s %-12s %14s %12s' % ('generator', 'method', 'logs/s', 'received'))
+        for name in args.generators.split(','):
+            generator = load_generator(name)
+            logs = [generator.create_log(date) for _ in range(args.count)]
+            for method in methods:
+                transport = method.split('-')[0].upper() if method.startswith(('tcp', 'tls')) else 'UDP'
+                server = LoopbackServer(transport, certfile=certfile, keyfile=keyfile).start()
+                started = time.perf_counter()
+                if method == 'sendto':
+                    soc = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                    for log in logs:
+                        config.read('syslog', 'host')
+                        config.read('syslog', 'port')
+                        soc.sendto(bytes(log, encoding='utf-8'), ('127.0.0.1', server.port))
+                    soc.close()
+                else:
+                    if transport == 'UDP':
+                        sender = UDPSender('127.0.0.1', server.port, batch_size=args.batch_size,
+                                           use_sendmmsg=method == 'sendmmsg')
+                    else:
+                        sender = StreamSender('127.0.0.1', server.port, framing=method.partition('-')[2] or 'octet',
+                                              ssl_context=get_ssl_context(verify=False) if transport == 'TLS' else None)
+                    sender.send_many(logs)
+                    sender.close()
+                elapsed = time.perf_counter() - started
+                received = server.wait(len(logs))
+                server.close()
+                print('%-12s %-12s %14.0f %11.1f%%' % (name, method, len(logs) / elapsed,
+                                                       100 * received / len(logs)))
+
+
+# Walks a whole time series in a fresh interpreter and prints its peak RSS in KiB. Only the full
+# series imports pandas, the chunked one walks the numpy blocks the generators use
+_RSS_SCRIPT = """
+import sys, resource
+count = int(sys.argv[2])
+if sys.argv[1] == 'date_range':
+    import pandas as pd
+    for block in [pd.date_range('2011-01-01', '2020-01-01', periods=count)]:
+        pass
+else:
+    from common.time_series import TimeSeries
+    for block in TimeSeries('2011-01-01', '2020-01-01', count).blocks():
+        pass
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def peak_rss(mode, count):
+    """
+    Peak RSS in MiB of building a time series of count timestamps
+    :param mode: date_range or chunked
+    :param count:
+    :return:
+    """
+    output = subprocess.run([sys.executable, '-c', _RSS_SCRIPT, mode, str(count)], check=True, capture_output=True,
+                            text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+    return int(output) / 1024
+
+
+def bench_memory(args):
+    """
+    Peak RSS of a full pd.date_range against the chunked TimeSeries for growing counts
+    :param args:
+    :return:
+    """
+    print('%-12s %18s %18s' % ('count', 'date_range MiB', 'chunked MiB'))
+    for count in args.counts:
+        print('%-12d %18.1f %18.1f' % (count, peak_rss('date_range', count), peak_rss('chunked', count)))
+
+
+def import_time(module):
+    """
+    Microseconds python -X importtime reports for importing a module in a fresh interpreter
+    :param module:
+    :return: (total of module, the three slowest modules it pulled in as (microseconds, name))
+    """
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module], check=True,
+                            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stderr
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if name.strip() == 'site':
+            # interpreter start up, not the module
+            imports = []
+            continue
+        imports.append((int(cumulative), name.strip()))
+    total = imports[-1][0]
+    return total, sorted(imports[:-1], reverse=True)[:3]
+
+
+def startup_time(argv, repeat=5):
+    """
+    Best wall time in milliseconds of running a command in a fresh interpreter
+    :param argv: python arguments
+    :param repeat:
+    :return:
+    """
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable] + argv, check=True, stdout=subprocess.DEVNULL,
+                       cwd=os.path.dirname(os.path.abspath(__file__)))
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_startup(args):
+    """
+    Import time of every generator module (python -X importtime) and wall time of its --help, against
+    a bare interpreter
+    :param args:
+    :return:
+    """
+    print('bare interpreter %.0f ms' % startup_time(['-c', 'pass']))
+    print('%-12s %10s %10s   %s' % ('generator', 'import ms', '--help ms', 'slowest imports'))
+    for name in args.generators.split(',') + ['log_faker']:
+        module = GENERATORS[name][0] if name in GENERATORS else name
+        total, slowest = import_time(module)
+        print('%-12s %10.1f %10.0f   %s' % (name, total / 1000, startup_time([module + '.py', '--help']),
+                                            ', '.join('%s %.1f' % (imported, micro / 1000)
+                                                      for micro, imported in slowest)))
+
+
+# Modes of the suite: backfill into a sink, or send to a local UDP socket
+SUITE_MODES = ('null', 'file', 'gzip', 'udp')
+
+
+class StageTimer:
+    """
+    Seconds spent in methods of the objects under test, wrapped in place by time()
+    """
+
+    def __init__(self):
+        self.seconds = collections.defaultdict(float)
+
+    def time(self, owner, method, stage):
+        """
+        Add the time of every call of owner.method to stage
+        :param owner: instance whose method is wrapped
+        :param method: method name
+        :param stage:
+        :return:
+        """
+        func = getattr(owner, method)
+        if func is None:
+            return
+
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.seconds[stage] += time.perf_counter() - started
+
+        setattr(owner, method, timed)
+
+
+def measure(name, mode, count):
+    """
+    Generate count logs of a generator between 2011 and 2020 block by block, the way the between dates
+    mode does, into the sink of mode, timing every stage. Run in a fresh interpreter by bench_suite so
+    the peak RSS is the run's own
+    :param name: generator
+    :param mode: see SUITE_MODES
+    :param count:
+    :return: dict of the results
+    """
+    import resource
+    from common.writer import LogWriter
+    from common.sender import UDPSender
+
+    count = int(count)
+    with tempfile.TemporaryDirectory() as tmp:
+        generator = load_generator(name, start='2011-01-01', end='2020-01-01', count=count, outdir=tmp)
+        blocks = list(generator.get_time_series().blocks())
+        # sample files, templates and pools are loaded before the clock starts
+        generator.create_logs(blocks[0][:1])
+
+        timer = StageTimer()
+        timer.time(generator, 'get_random_templates', 'pick')
+        timer.time(generator, 'get_ip_columns', 'ip')
+        timer.time(generator._formatter, 'format', 'date')
+        timer.time(generator, 'create_logs', 'create')
+        sink = None
+        if mode == 'udp':
+            sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sink.bind(('127.0.0.1', 0))
+            output = UDPSender('127.0.0.1', sink.getsockname()[1])
+            timer.time(output, '_send_batch', 'send')
+            timer.time(output, 'send_many', 'output')
+            write = output.send_many
+        else:
+            path = os.devnull if mode == 'null' else os.path.join(tmp, name + '.log')
+            output = LogWriter(path, compression='gzip' if mode == 'gzip' else None)
+            timer.time(output, '_compress', 'compress')
+            timer.time(output, '_write', 'write')
+            timer.time(output, 'flush', 'output')
+            write = output.write_many
+
+        lines = size = 0
+        started = time.perf_counter()
+        for block in blocks:
+            logs = generator.create_logs(block)
+            lines += len(logs)
+            size += sum(map(len, logs)) + len(logs)
+            write(logs)
+        output.close()
+        elapsed = time.perf_counter() - started
+        written = getattr(output, 'bytes', size)
+        if sink is not None:
+            sink.close()
+
+    stages = timer.seconds
+    # what the wrapped calls spent outside of the stages wrapped inside them
+    stages['render'] = stages.pop('create') - stages['pick'] - stages['ip'] - stages['date']
+    stages['encode'] = stages.pop('output') - stages['compress'] - stages['write'] - stages['send']
+    return {
+        'generator': name,
+        'mode': mode,
+        'lines': lines,
+        'seconds': elapsed,
+        'lines_per_sec': lines / elapsed,
+        'mb_per_sec': size / elapsed / 1024 / 1024,
+        'output_mb': written / 1024 / 1024,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'stages': {stage: stages[stage] for stage in ('pick', 'ip', 'date', 'render', 'encode', 'compress',
+                                                      'write', 'send')},
+    }
+
+
+def bench_suite(args):
+    """
+    Lines/sec, MB/sec of log text, seconds per stage and peak RSS of every generator in every mode, each
+    run in a fresh interpreter. Results can be saved as JSON and compared with the ones of another commit
+    :param args:
+    :return:
+    """
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as previous:
+            baseline = {(result['generator'], result['mode']): result for result in json.load(previous)['results']}
+    stages = ('pick', 'ip', 'date', 'render', 'encode', 'compress', 'write', 'send')
+    print('%-12s %-5s %10s %8s %8s %s %8s' % ('generator', 'mode', 'lines/s', 'MB/s', 'RSS MiB',
+                                             ' '.join('%8s' % stage for stage in stages),
+                                             'vs base' if baseline else ''))
+    results = []
+    for name in args.generators.split(','):
+        for mode in args.modes.split(','):
+            if mode not in SUITE_MODES:
+                raise ValueError("Unknown mode %s, use one of %s" % (mode, ', '.join(SUITE_MODES)))
+            output = subprocess.run([sys.executable, '-c', 'import sys, json, benchmark; '
+                                     'print(json.dumps(benchmark.measure(*sys.argv[1:])))', name, mode, str(args.count)],
+                                    check=True, capture_output=True, text=True,
+                                    cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+            result = json.loads(output.splitlines()[-1])
+            results.append(result)
+            previous = baseline.get((name, mode))
+            print('%-12s %-5s %10.0f %8.1f %8.1f %s %8s' % (
+                name, mode, result['lines_per_sec'], result['mb_per_sec'], result['peak_rss_mb'],
+                ' '.join('%8.3f' % result['stages'][stage] for stage in stages),
+                '%.2fx' % (result['lines_per_sec'] / previous['lines_per_sec']) if previous else ''))
+    if args.json:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+        with open(args.json, 'w') as report:
+            json.dump({'commit': commit, 'count': args.count, 'results': results}, report, indent=2)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmarks for log faker')
+    parser.add_argument('-c', '--count', type=int, help='Lines to generate per measurement', default=20000)
+    parser.add_argument('-g', '--generators', type=str, help='Comma separated generators to benchmark',
+                        default=','.join(GENERATORS))
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('templates', help='regex chain vs pre-parsed templates').set_defaults(func=bench_templates)
+    commands.add_parser('writer', help='per line write and print vs buffered writer').set_defaults(func=bench_writer)
+    commands.add_parser('dates', help='per line strftime vs batch formatting').set_defaults(func=bench_dates)
+    compression = commands.add_parser('compression', help='write then gzip vs gzip while writing')
+    compression.add_argument('--level', type=int, help='gzip level of the streaming writer')
+    compression.set_defaults(func=bench_compression)
+    sender = commands.add_parser('sender', help='per log sendto vs the UDP, TCP and TLS syslog senders')
+    sender.add_argument('--batch-size', type=int, help='Messages per sendmmsg call', default=256)
+    sender.set_defaults(func=bench_sender)
+    memory = commands.add_parser('memory', help='peak RSS of the time series as count grows')
+    memory.add_argument('--counts', type=int, nargs='+', help='Series lengths to measure',
+                        default=[10 ** 5, 10 ** 6, 10 ** 7, 10 ** 8])
+    memory.set_defaults(func=bench_memory)
+    commands.add_parser('startup', help='import time and --help time of every generator').set_defaults(
+        func=bench_startup)
+    suite = commands.add_parser('suite', help='lines/s, MB/s, time per stage and peak RSS of every generator '
+                                              'backfilling to a null sink, a file, gzip and sending over UDP')
+    suite.add_argument('--modes', type=str, help='Comma separated modes out of %s' % ', '.join(SUITE_MODES),
+                       default=','.join(SUITE_MODES))
+    suite.add_argument('--json', type=str, help='Save the results to this JSON file')
+    suite.add_argument('--baseline', type=str, help='JSON file of an earlier run to compare lines/s with')
+    suite.set_defaults(func=bench_suite)
+
+    args = parser.parse_args()
+    args.func(args)
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Command line options shared by every generator module
+"""
+
+import argparse
+
+from common.writer import DEFAULT_BUFFER_SIZE
+from common.compression import EXTENSIONS
+from common.rate import PROFILES
+from common.time_profile import SHAPES, parse_shapes
+from common.partition import PARTITIONS
+
+
+def get_parser(description, filename, count=1000000):
+    """
+    Argument parser with the options every generator understands
+    :param description: help text of the module
+    :param filename: default log file name
+    :param count: default log count
+    :return: argparse.ArgumentParser
+    """
+    parser = argparse.ArgumentParser(description=description)
+
+    parser.add_argument('-c', '--count', type=int, help='How much logs you want, default to %d' % count,
+                        default=count)
+    parser.add_argument('-o', '--outdir', type=str, help='Output dir for log file', default='destination')
+    parser.add_argument('-n', '--filename', type=str, help='Filename for log file', default=filename)
+    parser.add_argument('-s', '--start', type=str, help='Start date from which logs will generate',
+                        default='2011-01-01')
+    parser.add_argument('-e', '--end', type=str, help='End date up to which logs will generate',
+                        default='2020-01-01')
+    parser.add_argument(
+        '-m', '--mode', type=str, help='Generation mode whether logs will generate realtime or between given dates',
+        default='live'
+    )
+
+    echo = parser.add_mutually_exclusive_group()
+    echo.add_argument('--echo', dest='echo', action='store_true', default=None,
+                      help='Print every log to stdout, default only in live mode')
+    echo.add_argument('-q', '--quiet', dest='echo', action='store_false', help='Never print logs to stdout')
+    parser.add_argument('--buffer-size', type=int, help='Size of the chunks written to the log file',
+                        default=DEFAULT_BUFFER_SIZE)
+    parser.add_argument('-z', '--compression', type=str, choices=[name for name in EXTENSIONS if name] + ['none'],
+                        help='Compress the log file while it is generated, default gzip', default='gzip')
+    parser.add_argument('--compress-level', type=int, help='Compression level, default depends on compression')
+    parser.add_argument('--geoip', action='store_true',
+                        help='Append the GeoLite location of the source ip to every log (always on for live aws)')
+    parser.add_argument('--geoip-table', action='store_true',
+                        help='Like --geoip, but locate the whole ip store once up front (cached in resource/)')
+    parser.add_argument('--eps', type=float, help='Target logs per second in live mode, default one log at a time')
+    parser.add_argument('--burst', type=int, help='Most live logs sent at once to catch up, default one second worth')
+    parser.add_argument('--profile', type=str, choices=PROFILES, help='Live arrival profile with --eps',
+                        default='constant')
+    parser.add_argument('--batch-size', type=int,
+                        help='Syslog messages sent per system call, default batch_size in setup.cfg')
+    parser.add_argument('-w', '--workers', type=int, help='Processes generating between dates, default 1', default=1)
+    parser.add_argument('--split', action='store_true',
+                        help='With several workers keep one log file per worker instead of merging them')
+    parser.add_argument('--seed', type=int,
+                        help='Make the logs reproducible: the same seed and options give the same logs')
+    parser.add_argument('--part', type=str, nargs=2, metavar=('FROM', 'TO'),
+                        help='Only generate the logs of the --start/--end series falling from FROM up to TO, '
+                             'with --seed the same as those of the full run')
+    parser.add_argument('--time-profile', type=parse_shapes, default=(),
+                        help='Spread of the logs between dates: uniform, or some of %s comma separated, '
+                             'tuned in setup.cfg' % ', '.join(SHAPES))
+    parser.add_argument('--partition', type=str, choices=sorted(PARTITIONS),
+                        help='Write the logs between dates in one file per hour or day, under a directory named '
+                             'after the log file: destination/aws/2015/06/01/13.log.gz')
+    parser.add_argument('--max-size', type=float,
+                        help='MiB after which a log file between dates goes on in a new one (13.0001.log.gz)')
+    parser.add_argument('--spool', action='store_true',
+                        help='Write the logs between dates encoded to a spool (destination/aws.spool) for replay.py '
+                             'to send at a high rate, instead of the log file')
+    parser.add_argument('--stats-interval', type=float, default=10,
+                        help='Seconds between two live stats lines on stderr, 0 for none, default 10')
+    parser.add_argument('--metrics-port', type=int,
+                        help='Serve the live metrics for Prometheus at http://127.0.0.1:PORT/metrics')
+
+    return parser
+
+
+def get_options(args):
+    """
+    Generator keyword arguments from parsed command line
+    :param args:
+    :return: dict
+    """
+    return dict(start=args.start, end=args.end, count=args.count, outdir=args.outdir, filename=args.filename,
+                echo=args.echo, buffer_size=args.buffer_size,
+                compression=None if args.compression == 'none' else args.compression,
+                compress_level=args.compress_level, locate=args.geoip or args.geoip_table,
+                location_table=args.geoip_table, eps=args.eps, burst=args.burst, profile=args.profile,
+                batch_size=args.batch_size, seed=args.seed, time_profile=args.time_profile,
+                partition=args.partition, max_size=int(args.max_size * 1024 * 1024) if args.max_size else None,
+                spool=args.spool)
+
+
+def run(generator, args):
+    """
+    Start the generator in the mode asked on command line
+    :param generator:
+    :param args:
+    :return:
+    """
+    if (args.geoip or args.geoip_table) and not generator.can_locate():
+        raise SystemExit('error: --geoip: %s logs have no ip to locate' % generator.get_name())
+    if args.mode == 'live':
+        from common.metrics import start_reporting
+        start_reporting(args.stats_interval, args.metrics_port)
+        generator.generate_realtime()
+        return
+    first, last = 0, None
+    if args.part:
+        series = generator.get_time_series()
+        first, last = series.index_of(args.part[0]), series.index_of(args.part[1])
+    if args.workers > 1:
+        from common.sharding import generate_sharded
+        generate_sharded(generator, args.workers, split=args.split, first=first, last=last)
+    else:
+        generator.generate_between_dates(first, last)
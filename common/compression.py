@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Block compressors for streaming log files straight to compressed output
+"""
+
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+# File extension for every supported compression, None writes plain text
+EXTENSIONS = {
+    None: '',
+    'gzip': '.gz',
+    'zstd': '.zst',
+    'lz4': '.lz4',
+}
+
+DEFAULT_LEVELS = {
+    'gzip': 6,
+    'zstd': 3,
+    'lz4': 0,
+}
+
+
+def get_compressor(name, level=None):
+    """
+    A function turning one block of bytes into one complete, independently readable compressed member.
+    Concatenated members are still a valid file for gzip, zstd and lz4, so the output can be read up
+    to the last finished block even while it is being written
+    :param name: gzip, zstd, lz4 or None for no compression
+    :param level: compression level, codec default when None
+    :return: callable or None
+    """
+    if name is None:
+        return None
+    if name not in EXTENSIONS:
+        raise ValueError("Unknown compression %s, use one of %s" % (name, ', '.join(filter(None, EXTENSIONS))))
+    if level is None:
+        level = DEFAULT_LEVELS[name]
+
+    if name == 'gzip':
+        def compress(data):
+            compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+            return compressor.compress(data) + compressor.flush()
+        return compress
+
+    if name == 'zstd':
+        if zstandard is None:
+            raise ValueError("zstd compression needs the zstandard package installed")
+        return zstandard.ZstdCompressor(level=level).compress
+
+    if lz4 is None:
+        raise ValueError("lz4 compression needs the lz4 package installed")
+    return lambda data: lz4.frame.compress(data, compression_level=level)
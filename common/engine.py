@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+"""
+Asyncio engine running several realtime generators in one event loop and fanning their logs out to
+several destinations
+"""
+
+import sys
+import time
+import random
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from common.config_reader import ConfigReader
+from common.compression import EXTENSIONS
+from common.writer import LogWriter
+from common.rate import RateScheduler
+from common.sender import TRANSPORTS, open_sender
+from common.metrics import SourceMetrics, get_metrics, watch_sender
+
+# Batches of logs waiting per destination before new ones are dropped
+DEFAULT_QUEUE_SIZE = 1024
+# Most queued batches written by one call of a destination
+DRAIN_BATCHES = 64
+# Seconds between two destination reports
+REPORT_INTERVAL = 10
+# Logs per second of a generator with neither eps nor pauses of its own, so it can not take the loop
+DEFAULT_EPS = 1
+
+
+class Destination:
+    """
+    A sink with its own queue of log batches and its own writer thread. A slow destination only fills
+    its own queue: when it is full new batches are dropped (and counted), or with block the producers
+    wait for room
+    """
+
+    def __init__(self, name, queue_size=DEFAULT_QUEUE_SIZE, block=False):
+        """
+        Instance initialisation
+        :param name: shown in reports
+        :param queue_size: batches queued before dropping or blocking
+        :param block: wait for room instead of dropping when the queue is full
+        """
+        self.name = name
+        self.queue_size = queue_size
+        self.block = block
+        self.written = 0
+        self.dropped = 0
+        self._queue = None
+        self._executor = None
+
+    async def put(self, logs, created=None):
+        """
+        Queue a batch of logs
+        :param logs: list of str
+        :param created: time.perf_counter() when the batch was created, for the latency metrics
+        :return:
+        """
+        batch = (time.perf_counter() if created is None else created, logs)
+        if self.block:
+            await self._queue.put(batch)
+            return
+        try:
+            self._queue.put_nowait(batch)
+        except asyncio.QueueFull:
+            self.dropped += len(logs)
+
+    async def run(self):
+        """
+        Write queued batches in the destination's thread until cancelled
+        :return:
+        """
+        while True:
+            batches = [await self._queue.get()]
+            for _ in range(DRAIN_BATCHES):
+                if self._queue.empty():
+                    break
+                batches.append(self._queue.get_nowait())
+            await self.write_batches(batches)
+
+    async def write_batches(self, batches):
+        """
+        Write batches in the destination's thread in one call, timing it
+        :param batches: list of (created, logs)
+        :return:
+        """
+        logs = [log for _, batch in batches for log in batch]
+        started = time.perf_counter()
+        await asyncio.get_running_loop().run_in_executor(self._executor, self.write, logs)
+        written = time.perf_counter()
+        self.written += len(logs)
+        self._write_seconds.observe(written - started)
+        for created, batch in batches:
+            self._latency.observe(written - created, len(batch))
+
+    def start(self):
+        """
+        Queue and thread of the destination, created in the running loop. Its queue depth, counts and
+        write times go to the process metrics
+        :return: task writing the queue out
+        """
+        self._queue = asyncio.Queue(self.queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=self.name)
+        metrics = get_metrics()
+        metrics.gauge('queue_depth', 'Batches waiting for a destination', self._queue.qsize, destination=self.name)
+        metrics.gauge('written_total', 'Log lines written to a destination', lambda: self.written, kind='counter',
+                      destination=self.name)
+        metrics.gauge('dropped_total', 'Log lines dropped because a destination queue was full',
+                      lambda: self.dropped, kind='counter', destination=self.name)
+        self._write_seconds = metrics.histogram('stage_seconds', 'Seconds per batch spent in a stage of the hot '
+                                                                 'path', destination=self.name, stage='write')
+        self._latency = metrics.histogram('line_latency_seconds', 'Seconds from the creation of a line until it '
+                                                                  'was sent or written', destination=self.name)
+        return asyncio.ensure_future(self.run())
+
+    async def flush(self):
+        """
+        Write out what is still queued
+        :return:
+        """
+        batches = []
+        while not self._queue.empty():
+            batches.append(self._queue.get_nowait())
+        if batches:
+            await self.write_batches(batches)
+
+    def write(self, logs):
+        raise NotImplementedError
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+
+
+class SyslogDestination(Destination):
+    """
+    A syslog collector, over the transport of common.sender
+    """
+
+    def __init__(self, transport, host, port, **kwargs):
+        """
+        Instance initialisation
+        :param transport: UDP, TCP or TLS
+        :param host:
+        :param port:
+        :param kwargs: Destination options
+        """
+        super().__init__('%s://%s:%s' % (transport.lower(), host, port), **kwargs)
+        read = ConfigReader().read
+        self._sender = open_sender(transport, host, port, batch_size=int(read('syslog', 'batch_size')),
+                                   framing=read('syslog', 'framing'), pool_size=int(read('syslog', 'pool_size')),
+                                   ca_file=read('syslog', 'ca_file'),
+                                   verify=read('syslog', 'verify').lower() == 'true')
+        watch_sender(self._sender, self.name)
+        self._encode_seconds = get_metrics().histogram('stage_seconds', 'Seconds per batch spent in a stage of the '
+                                                                        'hot path', destination=self.name,
+                                                       stage='encode')
+
+    def write(self, logs):
+        started = time.perf_counter()
+        payloads = [log.encode('utf-8') for log in logs]
+        self._encode_seconds.observe(time.perf_counter() - started)
+        self._sender.send_payloads(payloads)
+
+    def close(self):
+        super().close()
+        self._sender.close()
+
+
+class FileDestination(Destination):
+    """
+    A log file, compressed when its name ends with a compression extension (.gz, .zst, .lz4)
+    """
+
+    def __init__(self, path, **kwargs):
+        """
+        Instance initialisation
+        :param path:
+        :param kwargs: Destination options
+        """
+        super().__init__(path, **kwargs)
+        compression = None
+        for name, extension in EXTENSIONS.items():
+            if name and path.endswith(extension):
+                compression, path = name, path[:-len(extension)]
+        self._writer = LogWriter(path, compression=compression)
+
+    def write(self, logs):
+        self._writer.write_many(logs)
+
+    def close(self):
+        super().close()
+        self._writer.close()
+
+
+class StdoutDestination(Destination):
+    """
+    Standard output
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__('stdout', **kwargs)
+
+    def write(self, logs):
+        logs.append('')
+        sys.stdout.write('\n'.join(logs))
+        sys.stdout.flush()
+
+
+def parse_destination(spec, **kwargs):
+    """
+    Destination from its command line form: udp://host:port, tcp://host:port, tls://host:port, a file path
+    or - for stdout
+    :param spec:
+    :param kwargs: Destination options
+    :return: Destination
+    """
+    if spec == '-':
+        return StdoutDestination(**kwargs)
+    scheme, separator, address = spec.partition('://')
+    if not separator:
+        return FileDestination(spec, **kwargs)
+    if scheme.upper() not in TRANSPORTS:
+        raise ValueError("Unknown destination %s, use one of %s, a file or -" % (
+            spec, ', '.join('%s://host:port' % name.lower() for name in TRANSPORTS)))
+    host, _, port = address.rpartition(':')
+    return SyslogDestination(scheme.upper(), host, int(port), **kwargs)
+
+
+class Engine:
+    """
+    A class running realtime generators concurrently in one event loop, every batch of logs goes to
+    every destination
+    """
+
+    def __init__(self, generators, destinations, report=sys.stderr, report_interval=REPORT_INTERVAL):
+        """
+        Instance initialisation
+        :param generators: configured generator instances, paced by their eps, burst and profile
+        :param destinations: list of Destination
+        :param report: stream the destination reports are written to, None to not report
+        :param report_interval: seconds between two reports
+        """
+        self.generators = generators
+        self.destinations = destinations
+        self.report = report
+        self.report_interval = report_interval
+
+    async def produce(self, generator):
+        """
+        Create the generator's logs in real time and queue them on every destination. Without eps
+        one log is created at a time, with the generator's pauses in between, or at DEFAULT_EPS when
+        it has none
+        :param generator:
+        :return:
+        """
+        generator.start_locating()
+        metrics = SourceMetrics(get_metrics(), generator.get_name())
+        generator.time_stages(metrics)
+        eps = generator.eps or (None if generator._REALTIME_PAUSES else DEFAULT_EPS)
+        if eps:
+            scheduler = RateScheduler(eps, burst=generator.burst, profile=generator.profile, report=None)
+            metrics.paced(scheduler)
+            async for count in scheduler:
+                if count:
+                    started = time.perf_counter()
+                    logs = generator.create_realtime_logs(count)
+                    metrics.created(logs, time.perf_counter() - started)
+                    await self.publish(logs, started)
+        while True:
+            started = time.perf_counter()
+            logs = generator.create_realtime_logs(1)
+            metrics.created(logs, time.perf_counter() - started)
+            await self.publish(logs, started)
+            await asyncio.sleep(random.sample(generator._REALTIME_PAUSES, 1)[0])
+
+    async def publish(self, logs, created=None):
+        """
+        Queue one batch on every destination
+        :param logs:
+        :param created: time.perf_counter() when the batch was created
+        :return:
+        """
+        for destination in self.destinations:
+            await destination.put(logs, created)
+
+    async def report_loop(self):
+        """
+        Write what every destination wrote and dropped and the stats line of the metrics, every
+        report_interval seconds
+        :return:
+        """
+        while True:
+            await asyncio.sleep(self.report_interval)
+            for destination in self.destinations:
+                self.report.write('%s: %d written, %d dropped, %d batches queued\n' % (
+                    destination.name, destination.written, destination.dropped, destination._queue.qsize()))
+            self.report.write(get_metrics().summary() + '\n')
+            self.report.flush()
+
+    async def run(self, duration=None):
+        """
+        Run until duration seconds passed, or forever
+        :param duration:
+        :return:
+        """
+        writers = [destination.start() for destination in self.destinations]
+        tasks = [asyncio.ensure_future(self.produce(generator)) for generator in self.generators]
+        if self.report is not None and self.report_interval:
+            tasks.append(asyncio.ensure_future(self.report_loop()))
+        try:
+            await asyncio.wait(tasks, timeout=duration, return_when=asyncio.FIRST_EXCEPTION)
+            for task in tasks:
+                if task.done() and task.exception() is not None:
+                    raise task.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+            for writer in writers:
+                writer.cancel()
+            await asyncio.gather(*tasks, *writers, return_exceptions=True)
+            for destination in self.destinations:
+                await destination.flush()
+                destination.close()
+
+    def start(self, duration=None):
+        """
+        Run the engine in a new event loop
+        :param duration: seconds to run, forever when None
+        :return:
+        """
+        try:
+            asyncio.run(self.run(duration))
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Pool of usernames shared by the generators
+"""
+
+import random
+
+from common.config_reader import config
+
+DISTRIBUTIONS = ('uniform', 'zipf')
+
+# Indexes drawn from the distribution at once
+DRAW_SIZE = 4096
+
+_POOL = None
+
+
+class IdentityPool:
+    """
+    size usernames, served by index. The username of an index is made by the pool's own Faker instance
+    seeded with seed and the index, so it does not depend on which indexes were asked before or on anyone
+    else using Faker, and only the ones actually used are ever made. Random picks follow the distribution: uniform, or zipf where index 0
+    is the most active user and index i is picked 1 / (i + 1) ** skew as often
+    """
+
+    def __init__(self, size, distribution='uniform', skew=1.1, seed=None):
+        """
+        Instance initialisation
+        :param size: number of distinct users
+        :param distribution: uniform or zipf, see DISTRIBUTIONS
+        :param skew: zipf exponent, higher puts more logs on the first users
+        :param seed: int, a fresh pool every run when None
+        """
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError("Unknown user distribution %s, use one of %s" % (distribution, ', '.join(DISTRIBUTIONS)))
+        import numpy as np
+        import faker
+
+        self.size = size
+        self.distribution = distribution
+        self.skew = skew
+        self.seed = random.getrandbits(32) if seed is None else seed
+        self._names = [None] * size
+        self._faker = faker.Faker()
+        self._weights = None
+        if distribution == 'zipf':
+            weights = 1 / np.arange(1, size + 1) ** skew
+            self._weights = weights / weights.sum()
+        self._random = np.random.default_rng(self.seed)
+        self._draws = []
+        self._next = 0
+
+    def get(self, index):
+        """
+        Username of an index
+        :param index:
+        :return: str
+        """
+        name = self._names[index]
+        if name is None:
+            self._faker.seed_instance(self.seed * self.size + index)
+            name = self._names[index] = self._faker.user_name()
+        return name
+
+    def reseed(self, seed):
+        """
+        Start a new stream of random picks, the users stay the same
+        :param seed:
+        :return:
+        """
+        import numpy as np
+        self._random = np.random.default_rng(seed)
+        self._draws = []
+        self._next = 0
+
+    def choice(self):
+        """
+        A random username following the distribution
+        :return: str
+        """
+        if self._next >= len(self._draws):
+            self._draws = self._random.choice(self.size, DRAW_SIZE, p=self._weights).tolist()
+            self._next = 0
+        index = self._draws[self._next]
+        self._next += 1
+        return self.get(index)
+
+
+def get_identity_pool():
+    """
+    The process wide pool configured in the [identities] section of setup.cfg, made on first use.
+    With a run seed (common.seeding) the users come from it instead of the configured seed
+    :return: IdentityPool
+    """
+    global _POOL
+    if _POOL is None:
+        from common.seeding import IDENTITIES, derive
+        seed = derive(IDENTITIES)
+        if seed is None and config.read('identities', 'seed'):
+            seed = int(config.read('identities', 'seed'))
+        _POOL = IdentityPool(int(config.read('identities', 'size')), config.read('identities', 'distribution'),
+                             skew=float(config.read('identities', 'skew')), seed=seed)
+    return _POOL
+
+
+def reset_identity_pool():
+    """
+    Make the pool again on next use
+    :return:
+    """
+    global _POOL
+    _POOL = None
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+Ip addresses made from weighted CIDR ranges
+"""
+
+import ipaddress
+
+from common.config_reader import config
+from common.resource import get_store
+
+SOURCES = ('ranges', 'store')
+
+# Addresses are made this many at a time and served from a buffer
+BUFFER_SIZE = 4096
+# Seed of the addresses a pinned pool keeps, the same every run so their locations are cached once
+PIN_SEED = 0
+
+# Dotted decimal text of every octet value
+_OCTETS = [str(octet) for octet in range(256)]
+
+_POOL = None
+
+
+class CIDRPool:
+    """
+    Random IPv4 addresses from a list of CIDR ranges. A range is picked in proportion to its weight and
+    the address is its base plus a random offset, so a /8 costs no more than a /32 and nothing is stored
+    per address. Network and broadcast addresses of ranges larger than /31 are never picked
+    """
+
+    def __init__(self, ranges, seed=None):
+        """
+        Instance initialisation
+        :param ranges: list of (cidr, weight)
+        :param seed: seed of the random stream, fresh entropy when None
+        """
+        import numpy as np
+
+        networks = [ipaddress.IPv4Network(cidr, strict=False) for cidr, _ in ranges]
+        if not networks:
+            raise ValueError("No ip ranges given")
+        weights = np.array([float(weight) for _, weight in ranges])
+        if weights.sum() <= 0 or (weights < 0).any():
+            raise ValueError("Ip range weights must be non negative and not all 0")
+        self.networks = networks
+        self.probabilities = weights / weights.sum()
+        # first usable address and number of usable addresses of every range
+        self._firsts = np.array([int(network.network_address) + (network.prefixlen < 31) for network in networks],
+                                dtype=np.int64)
+        self._sizes = np.array([network.num_addresses - 2 * (network.prefixlen < 31) for network in networks],
+                               dtype=np.int64)
+        self._random = np.random.default_rng(seed)
+        self._buffer = []
+        self._next = 0
+        self._pinned = None
+
+    @classmethod
+    def load(cls, name, seed=None):
+        """
+        Pool of a ranges file in resource/, one `cidr weight` per line, # starts a comment
+        :param name:
+        :param seed:
+        :return: CIDRPool
+        """
+        ranges = []
+        for line in get_store(name):
+            fields = line.split('#')[0].split()
+            if fields:
+                ranges.append((fields[0], fields[1] if len(fields) > 1 else 1))
+        return cls(ranges, seed)
+
+    def reseed(self, seed):
+        """
+        Start a new random stream
+        :param seed:
+        :return:
+        """
+        import numpy as np
+        self._random = np.random.default_rng(seed)
+        self._buffer = []
+        self._next = 0
+
+    def pin(self, per_range):
+        """
+        From now on make the addresses of every range from a fixed set of at most per_range of them, the
+        same every run, so all the addresses the pool gives out can be located once up front (LocationTable).
+        Ranges keep their weights
+        :param per_range: addresses kept per range
+        :return: list of every address the pool gives out, as text
+        """
+        import numpy as np
+
+        if self._pinned is None:
+            random = np.random.default_rng(PIN_SEED)
+            kept = [np.sort(random.choice(int(size), min(per_range, int(size)), replace=False)) + first
+                    for first, size in zip(self._firsts.tolist(), self._sizes.tolist())]
+            counts = np.array([len(addresses) for addresses in kept], dtype=np.int64)
+            # addresses of range i are _pinned[starts[i]:starts[i] + counts[i]]
+            addresses = np.concatenate(kept)
+            self._pinned = (addresses, np.cumsum(counts) - counts, counts, self.render(addresses.astype('uint32')))
+            self._buffer = []
+            self._next = 0
+        return self._pinned[3]
+
+    def generate(self, count):
+        """
+        count random addresses
+        :param count:
+        :return: numpy uint32 array
+        """
+        picks = self._random.choice(len(self.networks), count, p=self.probabilities)
+        if self._pinned is not None:
+            addresses, starts, counts, _ = self._pinned
+            offsets = (self._random.random(count) * counts[picks]).astype(counts.dtype)
+            return addresses[starts[picks] + offsets].astype('uint32')
+        offsets = (self._random.random(count) * self._sizes[picks]).astype(self._sizes.dtype)
+        return (self._firsts[picks] + offsets).astype('uint32')
+
+    @staticmethod
+    def render(addresses):
+        """
+        Dotted decimal text of addresses, one octet column at a time
+        :param addresses: numpy uint32 array
+        :return: list of str
+        """
+        octets = [((addresses >> shift) & 255).tolist() for shift in (24, 16, 8, 0)]
+        return ['%s.%s.%s.%s' % (_OCTETS[a], _OCTETS[b], _OCTETS[c], _OCTETS[d]) for a, b, c, d in zip(*octets)]
+
+    def choices(self, count):
+        """
+        count random addresses as text
+        :param count:
+        :return: list of str
+        """
+        missing = count - (len(self._buffer) - self._next)
+        if missing > 0:
+            # always made BUFFER_SIZE at a time, so the addresses of a seeded stream do not depend on
+            # how many were asked for at once
+            chunks = -(-missing // BUFFER_SIZE)
+            self._buffer = self._buffer[self._next:] + [address for _ in range(chunks)
+                                                        for address in self.render(self.generate(BUFFER_SIZE))]
+            self._next = 0
+        self._next += count
+        return self._buffer[self._next - count:self._next]
+
+    def choice(self):
+        return self.choices(1)[0]
+
+    def sample(self, count):
+        """
+        count random addresses, distinct unless the ranges are tiny
+        :param count:
+        :return: list of str
+        """
+        addresses = self.choices(count)
+        for _ in range(8):
+            if len(set(addresses)) == count:
+                break
+            addresses = self.choices(count)
+        return addresses
+
+
+def get_ip_pool():
+    """
+    Where the generators draw their ip addresses from, following [ip] in setup.cfg: a CIDRPool of the
+    ranges file or the flat ip store. One per process
+    :return: CIDRPool or ResourceStore
+    """
+    global _POOL
+    if _POOL is None:
+        source = config.read('ip', 'source')
+        if source not in SOURCES:
+            raise ValueError("Unknown ip source %s, use one of %s" % (source, ', '.join(SOURCES)))
+        if source == 'ranges':
+            _POOL = CIDRPool.load(config.read('ip', 'ranges'))
+        else:
+            _POOL = get_store('ip_store.txt')
+    return _POOL
+
+
+def pin_ip_pool():
+    """
+    Make the process ip pool give out only addresses a LocationTable can hold and list them: the whole ip
+    store, or with ranges the located_per_range addresses of every range kept by CIDRPool.pin
+    :return: (addresses, file the table of their locations is cached in)
+    """
+    from common.location_finder import TABLE_FILE, get_table_file
+    pool = get_ip_pool()
+    if isinstance(pool, CIDRPool):
+        return pool.pin(int(config.read('ip', 'located_per_range'))), get_table_file(config.read('ip', 'ranges'))
+    return pool, TABLE_FILE
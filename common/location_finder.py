@@ -7,10 +7,191 @@ Created on 10/9/2019
 
 # imports
 import os
-import geoip2.database
+import json
+import math
+import hashlib
+from array import array
+from collections import namedtuple
+from functools import lru_cache
 
 from common.config_reader import config
 
+Location = namedtuple('Location', ['city', 'country', 'latitude', 'longitude'])
+
+# geoip2-db mode in setup.cfg -> reader mode. geoip2 is only imported once a reader is needed,
+# it takes a good part of the start up time otherwise
+_MODES = {
+    'auto': 'MODE_AUTO',
+    'mmap': 'MODE_MMAP',
+    'file': 'MODE_FILE',
+    'memory': 'MODE_MEMORY',
+}
+
+_READER = None
+
+# Sidecar of the pre-enriched ip store, see LocationTable
+TABLE_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'resource', 'ip_store.geo.json')
+_TABLES = {}
+
+
+def get_table_file(name):
+    """
+    Sidecar of the locations of the ips of a resource file, ip_ranges.txt -> resource/ip_ranges.geo.json
+    :param name: file name in resource/
+    :return:
+    """
+    return os.path.join(os.path.dirname(TABLE_FILE), os.path.splitext(name)[0] + '.geo.json')
+
+
+def get_reader():
+    """
+    The process wide GeoLite reader, opened on first use and kept open
+    :return: geoip2.database.Reader
+    """
+    global _READER
+    if _READER is None:
+        import geoip2.database
+        mode = getattr(geoip2.database, _MODES[config.read('geoip2-db', 'mode')])
+        _READER = geoip2.database.Reader(get_db_path(), mode=mode)
+    return _READER
+
+
+@lru_cache(maxsize=int(config.read('geoip2-db', 'cache_size')))
+def lookup(ip_address):
+    """
+    Location of an ip address, cached per address
+    :param ip_address:
+    :return: Location, None when the address is not in the database
+    """
+    from geoip2.errors import AddressNotFoundError
+    try:
+        result = get_reader().city(ip_address)
+    except AddressNotFoundError:
+        return None
+    return Location(result.city.name, result.country.name, result.location.latitude, result.location.longitude)
+
+
+def cache_info():
+    """
+    Hits, misses and size of the lookup cache
+    :return: functools cache info named tuple
+    """
+    return lookup.cache_info()
+
+
+def get_db_path():
+    """
+    Absolute path of the GeoLite database
+    :return:
+    """
+    db = os.path.abspath(config.read('geoip2-db', 'db'))
+    if not os.path.isfile(db):
+        raise FileNotFoundError("GeoLite database is not present")
+    return db
+
+
+class LocationTable:
+    """
+    Locations of a fixed list of ip addresses, looked up once and kept in columns indexed by row
+    """
+
+    def __init__(self, ips, found, cities, countries, latitudes, longitudes):
+        """
+        Instance initialisation, use LocationTable.build or LocationTable.load
+        :param ips: list of ip addresses, row order of every column
+        :param found: 1 when the ip is in the database, 0 otherwise
+        :param cities: list of city names
+        :param countries: list of country names
+        :param latitudes: floats, nan when unknown
+        :param longitudes: floats, nan when unknown
+        """
+        self.ips = ips
+        self.rows = {ip: row for row, ip in enumerate(ips)}
+        self.found = bytearray(found)
+        self.cities = cities
+        self.countries = countries
+        self.latitudes = array('d', [math.nan if value is None else value for value in latitudes])
+        self.longitudes = array('d', [math.nan if value is None else value for value in longitudes])
+        self.key = None
+
+    @classmethod
+    def build(cls, ips):
+        """
+        Look up every ip in the database
+        :param ips:
+        :return: LocationTable
+        """
+        locations = [lookup(ip) for ip in ips]
+        found = [location is not None for location in locations]
+        locations = [location or Location(None, None, None, None) for location in locations]
+        return cls(list(ips), found, [location.city for location in locations],
+                   [location.country for location in locations], [location.latitude for location in locations],
+                   [location.longitude for location in locations])
+
+    @classmethod
+    def load(cls, ips, path=TABLE_FILE):
+        """
+        Table for ips from the sidecar file, rebuilt and saved again when the database or the ips changed.
+        The table of a path is kept for the life of the process
+        :param ips:
+        :param path: sidecar json file
+        :return: LocationTable
+        """
+        ips = [ip.strip() for ip in ips]
+        key = {
+            'db_mtime': os.path.getmtime(get_db_path()),
+            'ips': hashlib.sha1('\n'.join(ips).encode('utf-8')).hexdigest(),
+        }
+        table = _TABLES.get(path)
+        if table is not None and table.key == key:
+            return table
+
+        table = None
+        if os.path.isfile(path):
+            with open(path, 'r') as sidecar:
+                stored = json.load(sidecar)
+            if stored['key'] == key:
+                table = cls(ips, stored['found'], stored['cities'], stored['countries'], stored['latitudes'],
+                            stored['longitudes'])
+        if table is None:
+            table = cls.build(ips)
+            with open(path, 'w') as sidecar:
+                json.dump({
+                    'key': key,
+                    'found': list(table.found),
+                    'cities': table.cities,
+                    'countries': table.countries,
+                    'latitudes': [None if math.isnan(value) else value for value in table.latitudes],
+                    'longitudes': [None if math.isnan(value) else value for value in table.longitudes],
+                }, sidecar)
+        table.key = key
+        _TABLES[path] = table
+        return table
+
+    def get(self, row):
+        """
+        Location of the ip in a row
+        :param row:
+        :return: Location, None when the ip is not in the database
+        """
+        if not self.found[row]:
+            return None
+        latitude = self.latitudes[row]
+        longitude = self.longitudes[row]
+        return Location(self.cities[row], self.countries[row], None if math.isnan(latitude) else latitude,
+                        None if math.isnan(longitude) else longitude)
+
+    def find(self, ip_address):
+        """
+        Location of an ip, looked up in the database when it is not in the table
+        :param ip_address:
+        :return: Location or None
+        """
+        row = self.rows.get(ip_address)
+        if row is None:
+            return lookup(ip_address)
+        return self.get(row)
+
 
 class LocationFinder:
     """
@@ -23,38 +204,35 @@ class LocationFinder:
         :param ip_address:
         """
         self.ip_address = ip_address
-        db = os.path.abspath(config.read('geoip2-db', 'db'))
-        if not os.path.isfile(db):
-            raise FileNotFoundError("GeoLite database is not present")
-        else:
-            self._reader = geoip2.database.Reader(db)
-            self._result = self._reader.city(self.ip_address)
-            self._reader.close()
+        self._result = lookup(ip_address)
+        if self._result is None:
+            from geoip2.errors import AddressNotFoundError
+            raise AddressNotFoundError("The address %s is not in the database." % ip_address)
 
     def get_city(self):
         """
         Method to retrieve ip address city name
         :return: city in string
         """
-        return self._result.city.name
+        return self._result.city
 
     def get_country(self):
         """
         Method to retrieve ip address country
         :return: country in string
         """
-        return self._result.country.name
+        return self._result.country
 
     def get_latitude(self):
         """
         Method to retrieve ip address latitude
         :return: latitude in string
         """
-        return self._result.location.latitude
+        return self._result.latitude
 
     def get_longitude(self):
         """
         Method to retrieve ip address longitude
         :return: longitude in string
         """
-        return self._result.location.longitude
+        return self._result.longitude
@@ -1,30 +1,565 @@
-import re
-import socket
+import os
+import sys
+import time
+import random
+import functools
+import datetime
 
 from common.config_reader import ConfigReader
-from common.location_finder import LocationFinder
-from geoip2.errors import AddressNotFoundError
+from common.location_finder import lookup, get_db_path, LocationTable
+from common.ip_pool import pin_ip_pool
+from common.writer import LogWriter, DEFAULT_BUFFER_SIZE
+from common.partition import PartitionedWriter, get_root
+from common.template import compile_templates
+from common import seeding
+from utils import EPOCH, to_datetime, to_timestamp
+
+# numpy and the modules built on it (time series, batch formatting, rate scheduling) and the syslog
+# senders are imported where they are first needed, so `--help` does not pay for them
+
+_MICROSECOND = datetime.timedelta(microseconds=1)
+# Stages of create_logs timed in the process metrics, see BaseLogGenerator.time_stages
+CREATE_STAGES = ('date', 'ip', 'pick', 'render')
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class LazyAttribute:
+    """
+    A class attribute computed by load(cls) on first access and then stored on that class, so
+    sample files and ip stores are only read by the generators that are actually used
+    """
+
+    def __init__(self, load):
+        self.load = load
+
+    def __set_name__(self, owner, name):
+        self.owner = owner
+        self.name = name
+
+    def __get__(self, instance, owner):
+        value = self.load(owner)
+        # the class declaring it stays lazy for its subclasses
+        if owner is not self.owner:
+            setattr(owner, self.name, value)
+        return value
+
+
+def read_sample(cls):
+    """
+    Lines of the generator's sample file
+    :param cls: generator class
+    :return: list of str, empty when it has no _SAMPLE
+    """
+    if not cls._SAMPLE:
+        return []
+    with open(os.path.join(cls._ROOT, cls._SAMPLE), 'r') as sample:
+        return sample.readlines()
+
+
+def load_samples(cls, section='events', key=0):
+    """
+    Store of the generator's templates, weighted by the event type of every sample line with
+    _EVENT_WEIGHTS and the generator's line in the [events] section of setup.cfg
+    :param cls: generator class
+    :param section: setup.cfg section of the weights
+    :param key: see SampleStore
+    :return: SampleStore
+    """
+    from common.sample import SampleStore, parse_weights
+
+    events = None
+    if cls._EVENT_PATTERN is not None:
+        events = [match.group('event') if match else None for match in map(cls._EVENT_PATTERN.search, cls._SOURCE)]
+    weights = dict(cls._EVENT_WEIGHTS if section == 'events' else cls._BURST_WEIGHTS)
+    if cls._SAMPLE:
+        weights.update(parse_weights(cls._CONFIG.read(section, cls.get_name())))
+    return SampleStore(cls._TEMPLATES, events, weights, key=key)
+
+
+def load_burst_samples(cls):
+    """
+    Store of the templates picked during the bursts of a time profile, weighted with _BURST_WEIGHTS and
+    the [bursts] section of setup.cfg
+    :param cls: generator class
+    :return: SampleStore, None when bursts are made of the usual logs
+    """
+    store = load_samples(cls, 'bursts', key=1)
+    return store if store.probabilities is not None else None
 
 
 class BaseLogGenerator:
 
-    def __init__(self):
-        pass
+    def __init__(self, start=None, end=None, count=None, outdir=None, filename=None, echo=None,
+                 buffer_size=DEFAULT_BUFFER_SIZE, compression=None, compress_level=None, locate=False,
+                 location_table=False, eps=None, burst=None, profile='constant', batch_size=None, seed=None,
+                 time_profile=(), partition=None, max_size=None, spool=False):
+        """
+        Initial object with time series
+        :param echo: print generated logs to stdout, by default only in realtime mode
+        :param buffer_size: size of the chunks written in between dates mode
+        :param compression: gzip, zstd or lz4 to compress while generating between dates
+        :param compress_level: compression level
+        :param locate: append the geolocation of the log's ip to every log, see add_location
+        :param location_table: locate from the pre-enriched ip store (LocationTable) instead of the database
+        :param eps: realtime target events per second, see RateScheduler
+        :param burst: most realtime logs sent at once when catching up
+        :param profile: realtime arrival profile, see RateScheduler
+        :param batch_size: UDP syslog messages per sendmmsg call, defaults to batch_size in setup.cfg
+        :param seed: run seed making the generated logs reproducible, see common.seeding
+        :param time_profile: shapes of the between dates time series, see common.time_profile
+        :param partition: hour or day to write between dates logs in one file per partition, see common.partition
+        :param max_size: bytes after which a between dates log file goes on in a new one
+        :param spool: write the between dates logs to a spool for replays instead, see common.spool
+        """
+        self.seed = seed
+        if seed is not None:
+            # the picks subclasses make after this (a fixed user or device ip) come from the seed too
+            seeding.set_seed(seed)
+            seeding.seed_streams(seeding.derive(seeding.GENERATOR, self.get_stream()))
+        self.start = start
+        self.end = end
+        self.count = count
+        self.outdir = outdir
+        self.filename = filename
+        self.dest = os.path.abspath(os.path.join(self.outdir, self.filename))
+        self.echo = echo
+        self.buffer_size = buffer_size
+        self.compression = compression
+        self.compress_level = compress_level
+        self.locate = locate
+        self._location_table = LocationTable.load(*pin_ip_pool()) if location_table and self._IP_STORE else None
+        from common.time_format import BatchFormatter
+        self._formatter = BatchFormatter(self._DATE_FORMATS)
+        self.eps = eps
+        self.burst = burst
+        self.profile = profile
+        self.batch_size = batch_size
+        self.time_profile = tuple(time_profile or ())
+        self.partition = partition
+        self.max_size = max_size
+        self.spool = spool
+        self._sender = None
+        self._stages = None
+        self._no_database = False
 
     _CONFIG = ConfigReader()
-    _SOC = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    # Sample file of the generator, relative to _ROOT
+    _ROOT = _ROOT
+    _SAMPLE = None
+
+    # Raw sample lines and the same lines parsed once into templates (see common.template),
+    # both loaded on first use
+    _SOURCE = LazyAttribute(read_sample)
+    _TEMPLATES = LazyAttribute(lambda cls: compile_templates(cls._SOURCE, cls._RULES))
+    # The templates drawn from in bulk, see common.sample, and the ones drawn from for the logs of a burst
+    _SAMPLES = LazyAttribute(load_samples)
+    _BURST_SAMPLES = LazyAttribute(load_burst_samples)
+
+    # Event type of a sample line, a regex with an `event` group, and how many times more often than in
+    # the sample the lines of an event type are picked. The [events] section of setup.cfg adds to them
+    _EVENT_PATTERN = None
+    _EVENT_WEIGHTS = {}
+    # The same during the bursts of a time profile (common.time_profile), added to by the [bursts] section
+    _BURST_WEIGHTS = {}
+
+    # Substitution rules, grouped the way the replace_* methods apply them. _RULES is the
+    # full chain in the order create_log applies it and is what _TEMPLATES is built from
+    _IP_RULES = []
+    _DATE_RULES = []
+    _OTHER_RULES = []
+    _RULES = []
+
+    # Also forward every log to syslog while generating between dates
+    _FORWARD_BETWEEN_DATES = False
+
+    # Where the syslog header timestamp starts in a log and its fixed width strftime format, for replays
+    # of a spool to put the current time in (see common.spool). None to always replay logs as they are
+    _HEADER_TIME = None
+
+    # Where add_location finds the ip to look up: the template field holding it, or for a finished
+    # log a regex with an `ip` group. None when the vendor's logs have no ip worth locating
+    _LOCATION_FIELD = None
+    _LOCATION_PATTERN = None
+    # Appended to a log by add_location
+    _LOCATION_FORMAT = ' ip_city="%(city)s" latitude="%(latitude)s" longitude="%(longitude)s"'
+
+    # Seconds to pick a pause from between realtime logs when no rate is given, None to not pause
+    _REALTIME_PAUSES = None
+    # Always locate realtime logs, see add_location
+    _REALTIME_LOCATE = False
+
+    # Pool of ip addresses the vendor draws from (common.ip_pool), and the template fields that get
+    # a random address of it in every log
+    _IP_STORE = []
+    _IP_FIELDS = ()
+
+    # Template field name -> strftime format (or EPOCH) for every date the vendor writes
+    _DATE_FORMATS = {}
 
     def get_random_logs(self, count):
-        pass
+        """
+        Picks up random logs from source file
+        :return:
+        """
+        return [template.source for template in self.get_random_templates(count)]
+
+    def get_random_templates(self, count):
+        """
+        Picks up random pre-parsed templates, weighted by event type
+        :param count:
+        :return:
+        """
+        return self._SAMPLES.choices(count)
+
+    def get_ip_values(self):
+        """
+        Values for the fields used by _IP_RULES
+        :return: dict
+        """
+        return {name: next(iter(column)) for name, column in self.get_ip_columns(1).items()}
+
+    def get_ip_columns(self, count):
+        """
+        Values for the fields used by _IP_RULES of count logs at once, the addresses of _IP_FIELDS
+        are drawn from the pool in bulk
+        :param count:
+        :return: dict of name -> iterable of count values
+        """
+        if self._location_table is not None:
+            # a worker process started without the parent's pool pins its own the same way
+            pin_ip_pool()
+        if not self._IP_FIELDS:
+            return {}
+        # dealt out log by log, so the ips of the first n logs do not depend on count
+        addresses = self._IP_STORE.choices(count * len(self._IP_FIELDS))
+        return {name: addresses[index::len(self._IP_FIELDS)] for index, name in enumerate(self._IP_FIELDS)}
+
+    def get_other_values(self):
+        """
+        Values for the fields used by _OTHER_RULES
+        :return: dict
+        """
+        return {}
+
+    def format_dates(self, timestamp):
+        """
+        Values for the fields used by _DATE_RULES
+        :param timestamp:
+        :return: dict
+        """
+        return {
+            name: to_timestamp(timestamp) if str_format == EPOCH else to_datetime(timestamp, str_format)
+            for name, str_format in self._DATE_FORMATS.items()
+        }
+
+    def get_values(self, timestamp):
+        """
+        All field values needed to render one log line
+        :param timestamp:
+        :return: dict
+        """
+        values = self.get_ip_values()
+        values.update(self.get_other_values())
+        values.update(self.format_dates(timestamp))
+        return values
+
+    @staticmethod
+    def substitute(string, rules, values):
+        """
+        Apply rules one after another on a raw log string
+        :param string:
+        :param rules:
+        :param values:
+        :return:
+        """
+        for rule in rules:
+            string = rule.apply(string, values)
+        return string
 
     def replace_all_ips(self, string):
-        pass
+        return self.substitute(string, self._IP_RULES, self.get_ip_values())
 
     def replace_all_dates(self, string, timestamp):
-        pass
+        return self.substitute(string, self._DATE_RULES, self.format_dates(timestamp))
+
+    def replace_other(self, string):
+        return self.substitute(string, self._OTHER_RULES, self.get_other_values())
+
+    def create_log(self, date):
+        """
+        generates actual log lines with all information in it.
+        :param date:
+        :return:
+        """
+        template = self.get_random_templates(1)[0]
+        values = self.get_values(date)
+        log = template.render(values)
+        if self.locate:
+            log = self.add_location(log, values.get(self._LOCATION_FIELD))
+        return log
+
+    def create_logs(self, block, bursts=None, utc_offset=0):
+        """
+        generates log lines for a whole block of timestamps, all dates and ips of the block are made at once
+        :param block: numpy int64 array of microseconds since epoch, see TimeSeries.blocks
+        :param bursts: numpy bool array of the timestamps in a burst, their logs are picked with _BURST_WEIGHTS
+        :param utc_offset: see BatchFormatter.format
+        :return: list of logs
+        """
+        started = time.perf_counter()
+        columns = self._formatter.format(block, utc_offset)
+        dated = time.perf_counter()
+        columns.update(self.get_ip_columns(len(block)))
+        addressed = time.perf_counter()
+        names = list(columns)
+        templates = self.get_random_templates(len(block))
+        if bursts is not None and self._BURST_SAMPLES is not None:
+            positions = bursts.nonzero()[0].tolist()
+            for position, template in zip(positions, self._BURST_SAMPLES.choices(len(positions))):
+                templates[position] = template
+        picked = time.perf_counter()
+        logs = []
+        for template, row in zip(templates, zip(*columns.values())):
+            values = self.get_other_values()
+            values.update(zip(names, row))
+            log = template.render(values)
+            if self.locate:
+                log = self.add_location(log, values.get(self._LOCATION_FIELD))
+            logs.append(log)
+        if self._stages is not None:
+            date, ip, pick, render = self._stages
+            date.observe(dated - started)
+            ip.observe(addressed - dated)
+            pick.observe(picked - addressed)
+            render.observe(time.perf_counter() - picked)
+        return logs
+
+    def time_stages(self, metrics):
+        """
+        Time the CREATE_STAGES of every block from now on
+        :param metrics: SourceMetrics of this generator
+        :return:
+        """
+        self._stages = tuple(metrics.stage(stage) for stage in CREATE_STAGES)
+
+    def create_realtime_logs(self, count):
+        """
+        generates count log lines with the current time in them, local time like create_log(datetime.now())
+        and epoch fields from the real clock
+        :param count:
+        :return: list of logs
+        """
+        import numpy as np
+        now = time.time_ns() // 1000
+        utc_offset = datetime.datetime.fromtimestamp(now // 1000000).astimezone().utcoffset() // _MICROSECOND
+        return self.create_logs(np.full(count, now + utc_offset, dtype=np.int64), utc_offset=utc_offset)
+
+    def start_locating(self):
+        """
+        Locate realtime logs when asked to or when the vendor always does (_REALTIME_LOCATE). Without the
+        GeoLite database this is reported once and the logs go out without location, so a generator
+        sharing the process with others does not stop them
+        :return:
+        """
+        if not (self.locate or self._REALTIME_LOCATE) or not self.can_locate() or self._no_database:
+            return
+        if self._location_table is None:
+            try:
+                get_db_path()
+            except FileNotFoundError as error:
+                sys.stderr.write('%s: %s, logs are sent without location\n' % (self.get_name(), error))
+                sys.stderr.flush()
+                self.locate = False
+                self._no_database = True
+                return
+            from common.metrics import watch_lookup_cache
+            watch_lookup_cache()
+        self.locate = True
+
+    @classmethod
+    def can_locate(cls):
+        """
+        Whether the logs have an ip add_location can look up
+        :return:
+        """
+        return cls._LOCATION_FIELD is not None or cls._LOCATION_PATTERN is not None
+
+    def add_location(self, log, ip=None):
+        """
+        A method to return ip geolocation if ip present in log
+        :param log:
+        :param ip: address to locate, searched in the log with _LOCATION_PATTERN when not given
+        :return:
+        """
+        if ip is None:
+            match = self._LOCATION_PATTERN.search(log) if self._LOCATION_PATTERN is not None else None
+            if not match:
+                return log
+            ip = match.group('ip')
+        if self._location_table is not None:
+            location = self._location_table.find(ip)
+        else:
+            location = lookup(ip)
+        if location is None:
+            return log
+        return log + self._LOCATION_FORMAT % location._asdict()
+
+    def get_time_series(self, first=0, last=None):
+        """
+        Get time series for total log count, evenly spaced between start and end like pd.date_range, or
+        following the time profile.
+        It is produced lazily in blocks, first and last select a part of it so it can be generated in pieces
+        :param first: index of the first timestamp
+        :param last: index after the last timestamp, defaults to count
+        :return: TimeSeries
+        """
+        from common.time_series import TimeSeries
+        profile = None
+        if self.time_profile:
+            from common.time_profile import get_time_profile
+            profile = functools.partial(get_time_profile, shapes=self.time_profile)
+        return TimeSeries(self.start, self.end, self.count, first, last, profile=profile)
+
+    @classmethod
+    def get_name(cls):
+        """
+        Short name of the generator, the name of its sample file: samples/mssql.log -> mssql
+        :return:
+        """
+        return os.path.splitext(os.path.basename(cls._SAMPLE or cls.__name__))[0]
+
+    @classmethod
+    def get_stream(cls):
+        """
+        Number of this generator's random streams, see common.seeding
+        :return:
+        """
+        return seeding.get_stream(cls.__name__)
 
-    def generate_between_dates(self):
-        pass
+    def generate_between_dates(self, first=0, last=None):
+        """
+        Generate logs in given two dates. With a seed every block of the time series is made from its
+        own stream, so any part of it comes out the same as in a run of the whole series
+        :param first: index of the first log in the time series
+        :param last: index after the last log, defaults to count
+        :return:
+        """
+        with self.open_writer() as writer:
+            for block, logs in self.create_blocks(first, last):
+                writer.write_block(block, logs)
+                if self._FORWARD_BETWEEN_DATES:
+                    self.forward_many(logs)
+
+    def open_writer(self):
+        """
+        Writer of the between dates logs: the log file, or with a partition or max_size the partition
+        files under a directory named after it (destination/aws.log -> destination/aws/), or the spool
+        next to it (destination/aws.spool)
+        :return: LogWriter, PartitionedWriter or SpoolWriter
+        """
+        if self.spool:
+            from common.spool import SpoolWriter, get_spool_path
+            return SpoolWriter(get_spool_path(self.dest), [self._HEADER_TIME], [self.get_name()],
+                               buffer_size=self.buffer_size)
+        if self.partition or self.max_size:
+            return PartitionedWriter(get_root(self.dest), self.partition, self.max_size, buffer_size=self.buffer_size,
+                                     echo=bool(self.echo), compression=self.compression, level=self.compress_level)
+        return LogWriter(self.dest, buffer_size=self.buffer_size, echo=bool(self.echo), compression=self.compression,
+                         level=self.compress_level)
+
+    def create_blocks(self, first=0, last=None):
+        """
+        Logs of the time series block by block, see generate_between_dates
+        :param first: index of the first log in the time series
+        :param last: index after the last log, defaults to count
+        :return: generator of (numpy int64 microseconds, list of logs)
+        """
+        seeded = seeding.get_seed() is not None
+        series = self.get_time_series(first, last)
+        for number, skip, block in series.numbered_blocks(whole=seeded):
+            seeding.seed_block(self.get_stream(), number)
+            logs = self.create_logs(block, series.bursts(block))
+            if skip:
+                # the start of a block that is not ours, made only to get the streams to our part
+                del logs[:skip]
+                block = block[skip:]
+            yield block, logs
+
+    def generate_realtime(self):
+        """
+        Generates logs, with current time in it. With a target eps the logs of every tick of the
+        rate scheduler are created as one block and forwarded together. The time spent creating and
+        forwarding is counted in the process metrics, see common.metrics
+        :return:
+        """
+        from common.metrics import SourceMetrics, get_metrics
+
+        self.start_locating()
+        if seeding.get_seed() is not None:
+            seeding.seed_streams(seeding.derive(seeding.REALTIME, self.get_stream()))
+        metrics = SourceMetrics(get_metrics(), self.get_name())
+        self.time_stages(metrics)
+        encode = metrics.stage('encode')
+        forward = metrics.stage('forward')
+        if self.eps:
+            from common.rate import RateScheduler
+            # the stats line reports the target eps, see common.metrics
+            scheduler = RateScheduler(self.eps, burst=self.burst, profile=self.profile, report=None)
+            metrics.paced(scheduler)
+            for count in scheduler:
+                if not count:
+                    continue
+                started = time.perf_counter()
+                logs = self.create_realtime_logs(count)
+                created = time.perf_counter()
+                payloads = [log.encode('utf-8') for log in logs]
+                encoded = time.perf_counter()
+                self.forward_payloads(payloads)
+                forwarded = time.perf_counter()
+                metrics.created(logs, created - started)
+                encode.observe(encoded - created)
+                forward.observe(forwarded - encoded)
+                metrics.latency.observe(forwarded - started, len(logs))
+                if self.echo is not False:
+                    print('\n'.join(logs))
+
+        while True:
+            now = datetime.datetime.now()
+            started = time.perf_counter()
+            log = self.create_log(now)
+            created = time.perf_counter()
+            payload = log.encode('utf-8')
+            encoded = time.perf_counter()
+            self.forward_payloads([payload])
+            forwarded = time.perf_counter()
+            metrics.created([log], created - started)
+            encode.observe(encoded - created)
+            forward.observe(forwarded - encoded)
+            metrics.latency.observe(forwarded - started)
+            if self._REALTIME_PAUSES:
+                period = random.sample(self._REALTIME_PAUSES, 1)[0]
+                time.sleep(period)
+            if self.echo is not False:
+                print(log)
+
+    def __getstate__(self):
+        # the sender's socket stays in the process that opened it
+        state = self.__dict__.copy()
+        state['_sender'] = None
+        return state
+
+    def get_sender(self):
+        """
+        The syslog sender for the transport and destination in setup.cfg, opened on first use
+        :return: UDPSender or StreamSender
+        """
+        if self._sender is None:
+            from common.sender import open_syslog_sender
+            from common.metrics import watch_sender
+            self._sender, destination = open_syslog_sender(self._CONFIG.read, self.batch_size)
+            watch_sender(self._sender, destination)
+        return self._sender
 
     def forward(self, data):
         """
@@ -32,9 +567,20 @@ class BaseLogGenerator:
         :param data:
         :return:
         """
-        host = self._CONFIG.read('syslog', 'host')
-        port = self._CONFIG.read('syslog', 'port')
-        self._SOC.sendto(bytes(data, encoding='utf-8'), (host, int(port)))
+        self.get_sender().send(data)
 
-    def compress(self):
-        pass
+    def forward_many(self, logs):
+        """
+        Forward a list of logs to syslog daemon, batch_size of them per system call
+        :param logs:
+        :return:
+        """
+        self.get_sender().send_many(logs)
+
+    def forward_payloads(self, payloads):
+        """
+        Forward a list of logs already encoded to syslog daemon
+        :param payloads: list of bytes
+        :return:
+        """
+        self.get_sender().send_payloads(payloads)
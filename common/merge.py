@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Between dates logs of several generators merged into one time ordered stream
+"""
+
+import heapq
+
+import numpy as np
+
+from common.writer import LogWriter, DEFAULT_BUFFER_SIZE
+from common.partition import PartitionedWriter, get_root
+from common.spool import SpoolWriter, get_spool_path
+
+
+def split_count(count, weights):
+    """
+    Share count out in proportion to weights, the rounding goes to the largest remainders
+    :param count:
+    :param weights: list of numbers
+    :return: list of int summing to count
+    """
+    total = float(sum(weights))
+    exact = [count * weight / total for weight in weights]
+    counts = [int(share) for share in exact]
+    for index in sorted(range(len(exact)), key=lambda index: counts[index] - exact[index])[:count - sum(counts)]:
+        counts[index] += 1
+    return counts
+
+
+def merge_blocks(sources):
+    """
+    k-way merge of time ordered blocks. Every source holds on to the rest of its last block, a heap
+    orders the sources by the last timestamp they hold: everything up to the smallest of those can not
+    be followed by an earlier log and is merged and given out, then that source reads its next block.
+    So no more than one block per source is ever held, and logs with the same timestamp keep the order
+    of the sources
+    :param sources: iterators of (numpy int64 timestamps in order, list of logs)
+    :return: generator of (numpy int64 timestamps, list of logs, numpy uint8 source of every log) in
+    timestamp order
+    """
+    pending = [(np.empty(0, dtype=np.int64), [])] * len(sources)
+    heap = []
+
+    def read(index):
+        for block, logs in sources[index]:
+            if len(block):
+                pending[index] = (block, logs)
+                heapq.heappush(heap, (int(block[-1]), index))
+                return
+
+    for index in range(len(sources)):
+        read(index)
+    while heap:
+        watermark, index = heapq.heappop(heap)
+        stamps, lines, origins = [], [], []
+        for source, (block, logs) in enumerate(pending):
+            cut = int(np.searchsorted(block, watermark, side='right'))
+            if cut:
+                stamps.append(block[:cut])
+                lines.extend(logs[:cut])
+                origins.append(np.full(cut, source, dtype=np.uint8))
+                pending[source] = (block[cut:], logs[cut:])
+        if stamps:
+            stamps = np.concatenate(stamps)
+            order = np.argsort(stamps, kind='stable')
+            yield stamps[order], [lines[position] for position in order.tolist()], np.concatenate(origins)[order]
+        read(index)
+
+
+def generate_merged(generators, dest, buffer_size=DEFAULT_BUFFER_SIZE, compression=None, level=None, echo=False,
+                    partition=None, max_size=None, spool=False):
+    """
+    Generate the between dates logs of every generator into one file, ordered by timestamp
+    :param generators: generator instances, each with its own start, end and count
+    :param dest: log file, the compression extension is added to it
+    :param buffer_size: see LogWriter
+    :param compression: gzip, zstd, lz4 or None
+    :param level: compression level
+    :param echo: also print every log
+    :param partition: hour or day for one file per partition under a directory named after dest, see
+    PartitionedWriter
+    :param max_size: bytes after which a file goes on in its next part
+    :param spool: write a spool for replays next to dest instead, see common.spool
+    :return: path of the written file, list of them when partitioned
+    """
+    if spool:
+        writer = SpoolWriter(get_spool_path(dest), [generator._HEADER_TIME for generator in generators],
+                             [generator.get_name() for generator in generators], buffer_size=buffer_size)
+    elif partition or max_size:
+        writer = PartitionedWriter(get_root(dest), partition, max_size, buffer_size=buffer_size, echo=echo,
+                                   compression=compression, level=level)
+    else:
+        writer = LogWriter(dest, buffer_size=buffer_size, echo=echo, compression=compression, level=level)
+    with writer:
+        for block, logs, sources in merge_blocks([generator.create_blocks() for generator in generators]):
+            if spool:
+                # the kind of a spooled log is the generator it came from
+                writer.write_block(block, logs, sources)
+            else:
+                writer.write_block(block, logs)
+    return writer.paths if isinstance(writer, PartitionedWriter) else writer.path
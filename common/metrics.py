@@ -0,0 +1,434 @@
+# -*- coding: utf-8 -*-
+"""
+Counters and timers of the realtime hot path, reported as a stats line and over HTTP for Prometheus
+"""
+
+import sys
+import time
+import bisect
+import threading
+
+# Upper bounds in seconds of the latency histogram buckets, 1 µs up to 10 s
+LATENCY_BUCKETS = tuple(scale * 10 ** exponent for exponent in range(-6, 1) for scale in (1, 2.5, 5)) + (10.0,)
+# Prefix of every exported metric name
+PREFIX = 'log_faker_'
+
+_METRICS = None
+
+
+class Counter:
+    """
+    A number that only goes up
+    """
+
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def add(self, amount=1):
+        self.value += amount
+
+
+class Gauge:
+    """
+    A number read from a function whenever it is reported, e.g. the depth of a queue
+    """
+
+    __slots__ = ('read',)
+
+    def __init__(self, read):
+        self.read = read
+
+    @property
+    def value(self):
+        return self.read()
+
+
+class Histogram:
+    """
+    Observations counted in fixed buckets, quantiles are estimated from the buckets
+    """
+
+    __slots__ = ('bounds', 'counts', 'count', 'sum')
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        # one more bucket for everything above the last bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value, weight=1):
+        """
+        Count value weight times, e.g. the latency of every line of a batch
+        :param value:
+        :param weight:
+        :return:
+        """
+        self.counts[bisect.bisect_left(self.bounds, value)] += weight
+        self.count += weight
+        self.sum += value * weight
+
+    def quantile(self, q):
+        """
+        Upper bound of the bucket holding the q quantile
+        :param q: 0 to 1
+        :return: seconds, None without observations
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class Metrics:
+    """
+    The counters, gauges and histograms of a process by name and labels. The hot path only adds to
+    objects it looked up once, reports read them from other threads
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self._metrics = {}
+        self._help = {}
+        self._last = (self.started, 0, 0, 0)
+        self._last_latency = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.eps = 0.0
+
+    def _get(self, kind, name, description, labels, make):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            metric = self._metrics[key] = make()
+            self._help[name] = (kind, description)
+        return metric
+
+    def counter(self, name, description, **labels):
+        """
+        The counter of a name and labels, made on first use
+        :param name:
+        :param description: help text of the name
+        :param labels:
+        :return: Counter
+        """
+        return self._get('counter', name, description, labels, Counter)
+
+    def gauge(self, name, description, read, kind='gauge', **labels):
+        """
+        Report what read() returns under a name and labels
+        :param name:
+        :param description: help text of the name
+        :param read: function returning the value
+        :param kind: gauge, or counter for a total kept elsewhere (e.g. by a sender)
+        :param labels:
+        :return: Gauge
+        """
+        self._metrics.pop((name, tuple(sorted(labels.items()))), None)
+        return self._get(kind, name, description, labels, lambda: Gauge(read))
+
+    def histogram(self, name, description, **labels):
+        """
+        The histogram of a name and labels, made on first use
+        :param name:
+        :param description: help text of the name
+        :param labels:
+        :return: Histogram
+        """
+        return self._get('histogram', name, description, labels, Histogram)
+
+    def total(self, name):
+        """
+        Sum of a counter or gauge over all its labels
+        :param name:
+        :return:
+        """
+        return sum(metric.value for (metric_name, _), metric in list(self._metrics.items()) if metric_name == name)
+
+    def merged(self, name, **labels):
+        """
+        One histogram of a name over all the metrics having labels
+        :param name:
+        :param labels: e.g. stage='create'
+        :return: Histogram
+        """
+        merged = Histogram()
+        for (metric_name, metric_labels), metric in list(self._metrics.items()):
+            if metric_name == name and labels.items() <= dict(metric_labels).items():
+                merged.counts = [a + b for a, b in zip(merged.counts, metric.counts)]
+                merged.count += metric.count
+                merged.sum += metric.sum
+        return merged
+
+    def summary(self):
+        """
+        One line of stats: lines so far, eps (and the target eps of paced sources), MB/s and per line
+        latency since the last summary, send errors, queued batches, the seconds spent in every stage
+        so far and the GeoLite lookup cache hit rate
+        :return: str
+        """
+        now = time.monotonic()
+        lines, size = self.total('lines_total'), self.total('bytes_total')
+        due = self.total('target_lines_total')
+        last, last_lines, last_size, last_due = self._last
+        self._last = (now, lines, size, due)
+        elapsed = max(now - last, 1e-9)
+        self.eps = (lines - last_lines) / elapsed
+        target = ' (target %.0f)' % ((due - last_due) / elapsed) if due else ''
+        latency = Histogram()
+        counts = self.merged('line_latency_seconds').counts
+        latency.counts = [count - last for count, last in zip(counts, self._last_latency)]
+        latency.count = sum(latency.counts)
+        self._last_latency = counts
+        stages = ', '.join('%s %.1fs' % (stage, self.merged('stage_seconds', stage=stage).sum)
+                           for stage in self.stages())
+        lookups = self.total('geoip_cache_hits_total') + self.total('geoip_cache_misses_total')
+        cache = 'geoip cache %.0f%% hits %d cached' % (100.0 * self.total('geoip_cache_hits_total') / lookups,
+                                                       self.total('geoip_cache_size')) if lookups else ''
+        line = '%d lines, %.0f eps%s, %.2f MB/s, %d send errors, %d queued, latency p50 %s p99 %s' % (
+            lines, self.eps, target, (size - last_size) / elapsed / 1024 / 1024, self.total('send_errors_total'),
+            self.total('queue_depth'), format_seconds(latency.quantile(0.5)), format_seconds(latency.quantile(0.99)))
+        return ', '.join(part for part in (line, stages, cache) if part)
+
+    def stages(self):
+        """
+        Names of the stages timed so far
+        :return: list of str
+        """
+        return sorted({dict(labels)['stage'] for name, labels in list(self._metrics) if name == 'stage_seconds'})
+
+    def prometheus(self):
+        """
+        Every metric in the Prometheus text exposition format
+        :return: str
+        """
+        lines = []
+        by_name = {}
+        for (name, labels), metric in list(self._metrics.items()):
+            by_name.setdefault(name, []).append((labels, metric))
+        # without stats lines the rate is the one since start up
+        eps = self.eps if self._last[0] != self.started else self.total('lines_total') / (
+            time.monotonic() - self.started)
+        by_name['eps'] = [((), Gauge(lambda: eps))]
+        self._help.setdefault('eps', ('gauge', 'Lines per second over the last stats interval'))
+        for name, metrics in sorted(by_name.items()):
+            kind, description = self._help[name]
+            lines.append('# HELP %s%s %s' % (PREFIX, name, description))
+            lines.append('# TYPE %s%s %s' % (PREFIX, name, kind))
+            for labels, metric in metrics:
+                if kind != 'histogram':
+                    lines.append('%s%s%s %s' % (PREFIX, name, format_labels(labels), metric.value))
+                    continue
+                seen = 0
+                for bound, count in zip(metric.bounds + (float('inf'),), metric.counts):
+                    seen += count
+                    lines.append('%s%s_bucket%s %d' % (PREFIX, name, format_labels(labels + (('le', '%g' % bound
+                                                       if bound != float('inf') else '+Inf'),)), seen))
+                lines.append('%s%s_sum%s %s' % (PREFIX, name, format_labels(labels), metric.sum))
+                lines.append('%s%s_count%s %d' % (PREFIX, name, format_labels(labels), metric.count))
+        return '\n'.join(lines) + '\n'
+
+    def report_every(self, interval, stream=sys.stderr):
+        """
+        Write a summary to stream every interval seconds from a daemon thread
+        :param interval: seconds
+        :param stream:
+        :return: thread
+        """
+        def report():
+            while True:
+                time.sleep(interval)
+                stream.write(self.summary() + '\n')
+                stream.flush()
+
+        thread = threading.Thread(target=report, name='metrics-report', daemon=True)
+        thread.start()
+        return thread
+
+    def serve(self, port, host='127.0.0.1'):
+        """
+        Serve the metrics at http://host:port/metrics from a daemon thread
+        :param port: 0 for any free port
+        :param host:
+        :return: the HTTP server, its server_address has the port
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+        return server
+
+
+class SourceMetrics:
+    """
+    The metrics one generator adds to on its hot path, looked up once
+    """
+
+    def __init__(self, metrics, source):
+        """
+        Instance initialisation
+        :param metrics: Metrics
+        :param source: generator name, the source label
+        """
+        self.lines = metrics.counter('lines_total', 'Log lines created', source=source)
+        self.bytes = metrics.counter('bytes_total', 'Characters of log lines created', source=source)
+        self._metrics = metrics
+        self._source = source
+        self._stages = {}
+        self._latency = None
+
+    @property
+    def latency(self):
+        """
+        Histogram of the seconds from the creation of a line until it was sent, made on first use since
+        behind the engine the destinations measure it
+        :return: Histogram
+        """
+        if self._latency is None:
+            self._latency = self._metrics.histogram('line_latency_seconds', 'Seconds from the creation of a line '
+                                                    'until it was sent or written', source=self._source)
+        return self._latency
+
+    def stage(self, name):
+        """
+        Histogram of the seconds of a stage of this source, per batch
+        :param name: create, forward, write...
+        :return: Histogram
+        """
+        histogram = self._stages.get(name)
+        if histogram is None:
+            histogram = self._stages[name] = self._metrics.histogram(
+                'stage_seconds', 'Seconds per batch spent in a stage of the hot path', source=self._source, stage=name)
+        return histogram
+
+    def paced(self, scheduler):
+        """
+        Report the logs a rate scheduler of this source asked for, the target eps of the stats line
+        :param scheduler: RateScheduler
+        :return:
+        """
+        self._metrics.gauge('target_lines_total', 'Log lines due following the target rate',
+                            lambda: int(scheduler.due), kind='counter', source=self._source)
+
+    def created(self, logs, seconds):
+        """
+        Count a batch of created logs
+        :param logs: list of str
+        :param seconds: time it took
+        :return:
+        """
+        self.lines.value += len(logs)
+        self.bytes.value += sum(map(len, logs)) + len(logs)
+        self.stage('create').observe(seconds)
+
+
+def watch_sender(sender, destination, metrics=None):
+    """
+    Report the counters a syslog sender keeps: messages, errors and for TCP and TLS the writes the
+    collector could not take at once and the seconds spent waiting on it
+    :param sender: UDPSender or StreamSender
+    :param destination: the destination label
+    :param metrics: defaults to the process metrics
+    :return:
+    """
+    metrics = metrics or get_metrics()
+    metrics.gauge('sent_total', 'Syslog messages sent', lambda: sender.sent, kind='counter', destination=destination)
+    metrics.gauge('send_errors_total', 'Syslog messages that could not be sent', lambda: sender.errors,
+                  kind='counter', destination=destination)
+    if hasattr(sender, 'stalls'):
+        metrics.gauge('send_stalls_total', 'Writes the collector could not take at once', lambda: sender.stalls,
+                      kind='counter', destination=destination)
+        metrics.gauge('send_blocked_seconds_total', 'Seconds spent waiting for the collector to take writes',
+                      lambda: sender.blocked, kind='counter', destination=destination)
+
+
+def watch_lookup_cache(metrics=None):
+    """
+    Report the hits, misses and size of the GeoLite lookup cache, see common.location_finder
+    :param metrics: defaults to the process metrics
+    :return:
+    """
+    from common.location_finder import cache_info
+
+    metrics = metrics or get_metrics()
+    metrics.gauge('geoip_cache_hits_total', 'GeoLite lookups answered by the cache', lambda: cache_info().hits,
+                  kind='counter')
+    metrics.gauge('geoip_cache_misses_total', 'GeoLite lookups read from the database', lambda: cache_info().misses,
+                  kind='counter')
+    metrics.gauge('geoip_cache_size', 'Addresses held by the GeoLite lookup cache', lambda: cache_info().currsize)
+
+
+def start_reporting(interval=None, port=None, stream=sys.stderr):
+    """
+    Start the stats line and the HTTP endpoint of the process metrics
+    :param interval: seconds between two stats lines, None or 0 for none
+    :param port: port of the local HTTP endpoint, None for none
+    :param stream: where the stats lines go
+    :return: Metrics
+    """
+    metrics = get_metrics()
+    if interval:
+        metrics.report_every(interval, stream)
+    if port is not None:
+        server = metrics.serve(port)
+        stream.write('metrics at http://%s:%d/metrics\n' % server.server_address[:2])
+        stream.flush()
+    return metrics
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                             for name, value in labels)
+
+
+def format_seconds(seconds):
+    """
+    Human readable duration of a latency
+    :param seconds: None when unknown
+    :return: str
+    """
+    if seconds is None:
+        return '-'
+    if seconds == float('inf'):
+        return '>%gs' % LATENCY_BUCKETS[-1]
+    if seconds < 1e-3:
+        return '%.0fus' % (seconds * 1e6)
+    if seconds < 1:
+        return '%.1fms' % (seconds * 1e3)
+    return '%.1fs' % seconds
+
+
+def get_metrics():
+    """
+    The metrics of the process, made on first use
+    :return: Metrics
+    """
+    global _METRICS
+    if _METRICS is None:
+        _METRICS = Metrics()
+    return _METRICS
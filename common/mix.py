@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Several generators interleaved into one stream by weight
+"""
+
+import numpy as np
+
+from common.registry import GENERATORS
+from common import seeding
+
+
+def parse_mix(spec):
+    """
+    Weights of a mix from its command line form, aws=40,fortigate=30,sonicwall=30
+    :param spec:
+    :return: dict of generator name -> weight
+    """
+    weights = {}
+    for part in spec.split(','):
+        name, separator, weight = part.partition('=')
+        name = name.strip()
+        if name not in GENERATORS:
+            raise ValueError("Unknown generator %s, use one of %s" % (name, ', '.join(GENERATORS)))
+        try:
+            weights[name] = float(weight) if separator else 1.0
+        except ValueError:
+            raise ValueError("Weight of %s is not a number: %s" % (name, weight))
+        if weights[name] < 0:
+            raise ValueError("Weight of %s is negative" % name)
+    if not sum(weights.values()):
+        raise ValueError("Mix %s has no weight" % spec)
+    return weights
+
+
+class MixedGenerator:
+    """
+    Realtime logs of several generators in one stream at eps in total. Every log of a batch comes from
+    a generator picked at random with the probability of its weight, so vendors are interleaved
+    """
+
+    # the generators keep their own pauses
+    _REALTIME_PAUSES = None
+
+    def __init__(self, generators, weights, eps, burst=None, profile='constant'):
+        """
+        Instance initialisation
+        :param generators: generator instances
+        :param weights: weight of every generator, same order
+        :param eps: target events per second of the whole mix
+        :param burst: most logs sent at once to catch up
+        :param profile: arrival profile, see RateScheduler
+        """
+        self.generators = generators
+        self.weights = np.asarray(weights, dtype=float) / sum(weights)
+        self.eps = eps
+        self.burst = burst
+        self.profile = profile
+        self._random = np.random.default_rng(seeding.derive(seeding.MIX))
+        self.start_locating()
+
+    def get_name(self):
+        return '+'.join(generator.get_name() for generator in self.generators)
+
+    def start_locating(self):
+        """
+        Location settings of every generator of the mix, see BaseLogGenerator.start_locating
+        :return:
+        """
+        for generator in self.generators:
+            generator.start_locating()
+
+    def time_stages(self, metrics):
+        """
+        Time the create stages of every generator of the mix, see BaseLogGenerator.time_stages
+        :param metrics: SourceMetrics of the mix
+        :return:
+        """
+        for generator in self.generators:
+            generator.time_stages(metrics)
+
+    def create_realtime_logs(self, count):
+        """
+        count logs with the current time, interleaved over the generators
+        :param count:
+        :return: list of logs
+        """
+        picks = self._random.choice(len(self.generators), count, p=self.weights)
+        counts = np.bincount(picks, minlength=len(self.generators))
+        streams = [
+            iter(generator.create_realtime_logs(int(generated)) if generated else ())
+            for generator, generated in zip(self.generators, counts)
+        ]
+        return [next(streams[pick]) for pick in picks]
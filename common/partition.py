@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+Between dates output split into one file per hour or day, and per size, so it can be loaded in parallel
+"""
+
+import os
+import re
+import shutil
+import datetime
+from collections import OrderedDict
+
+from common.writer import LogWriter, DEFAULT_BUFFER_SIZE
+
+# Partition -> (microseconds it spans, path of its file under the root)
+PARTITIONS = {
+    'hour': (3600 * 1000000, '%Y/%m/%d/%H'),
+    'day': (86400 * 1000000, '%Y/%m/%d'),
+}
+
+# Partition files kept open at once, the least recently written one is closed first
+DEFAULT_MAX_OPEN = 64
+# With a max_size the logs are written this many at a time and the size checked in between
+_SIZE_STEP = 256
+
+_UNIX = datetime.datetime(1970, 1, 1)
+# a size rolled file: 14.0003.log.gz is part 3 of 14.log.gz
+_PART = re.compile(r'^(?P<base>.*?)(?:\.(?P<part>\d{4}))?\.log(?P<ext>(\.\w+)?)$')
+
+
+class PartitionedWriter:
+    """
+    A LogWriter per partition under a root directory: root/YYYY/MM/DD/HH.log.gz for hours,
+    root/YYYY/MM/DD.log.gz for days, and with a max_size the next part (HH.0001.log.gz ...) once a file
+    is that big. With a max_size and no partition the files are root/part.log.gz, root/part.0001.log.gz ...
+    """
+
+    def __init__(self, root, partition=None, max_size=None, buffer_size=DEFAULT_BUFFER_SIZE, echo=False,
+                 compression=None, level=None, max_open=DEFAULT_MAX_OPEN):
+        """
+        Instance initialisation
+        :param root: directory of the partitions
+        :param partition: hour, day or None for size parts only, see PARTITIONS
+        :param max_size: bytes after which a partition goes on in its next part, None for no limit
+        :param buffer_size: see LogWriter
+        :param echo: see LogWriter
+        :param compression: gzip, zstd, lz4 or None, every partition file is compressed on its own
+        :param level: compression level
+        :param max_open: partition files kept open at once
+        """
+        if partition is not None and partition not in PARTITIONS:
+            raise ValueError("Unknown partition %s, use one of %s" % (partition, ', '.join(PARTITIONS)))
+        if partition is None and not max_size:
+            raise ValueError("Partition by time, by size or both")
+        self.root = root
+        self.partition = partition
+        self.max_size = max_size
+        self.buffer_size = buffer_size
+        self.echo = echo
+        self.compression = compression
+        self.level = level
+        self.max_open = max_open
+        self.lines = 0
+        self.bytes = 0
+        self.paths = []
+        self._span = PARTITIONS[partition][0] if partition else None
+        self._writers = OrderedDict()
+        self._parts = {}
+        self._opened = set()
+
+    def get_path(self, bucket, part):
+        """
+        File of one part of a partition
+        :param bucket: partition number, microseconds since epoch // span
+        :param part: size part of the partition
+        :return: path
+        """
+        if self.partition is None:
+            name = 'part'
+        else:
+            name = (_UNIX + datetime.timedelta(microseconds=bucket * self._span)).strftime(
+                PARTITIONS[self.partition][1])
+        if part:
+            name += '.%04d' % part
+        return os.path.join(self.root, name + '.log')
+
+    def _get_writer(self, bucket):
+        """
+        Open writer of a partition, opened again (appending) when it was closed to make room
+        :param bucket:
+        :return: LogWriter
+        """
+        writer = self._writers.get(bucket)
+        if writer is not None:
+            self._writers.move_to_end(bucket)
+            return writer
+        part = self._parts.setdefault(bucket, 0)
+        path = self.get_path(bucket, part)
+        append = path in self._opened
+        self._opened.add(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        writer = self._writers[bucket] = LogWriter(path, buffer_size=self.buffer_size, echo=self.echo,
+                                                   compression=self.compression, level=self.level, append=append)
+        if not append:
+            self.paths.append(writer.path)
+        if len(self._writers) > self.max_open:
+            self._close(next(iter(self._writers)))
+        return writer
+
+    def _close(self, bucket):
+        writer = self._writers.pop(bucket)
+        writer.close()
+        self.lines += writer.lines
+        self.bytes += writer.bytes
+
+    def write_block(self, block, logs):
+        """
+        Add the logs of a block of timestamps to their partitions
+        :param block: numpy int64 microseconds since epoch, in order
+        :param logs: one per timestamp
+        :return:
+        """
+        import numpy as np
+
+        if not len(block):
+            return
+        if self._span is None:
+            buckets = np.zeros(len(block), dtype=np.int64)
+        else:
+            buckets = block // self._span
+        # the block is in order, so every partition is one run of it
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1, [len(block)])).tolist()
+        for first, last in zip(starts, starts[1:]):
+            bucket = int(buckets[first])
+            if not self.max_size:
+                self._get_writer(bucket).write_many(logs[first:last])
+                continue
+            # the size only grows when the writer flushes, so files end up to a buffer bigger than max_size
+            for step in range(first, last, _SIZE_STEP):
+                writer = self._get_writer(bucket)
+                writer.write_many(logs[step:min(step + _SIZE_STEP, last)])
+                if writer.bytes >= self.max_size:
+                    # the rest of the partition goes to its next part
+                    self._close(bucket)
+                    self._parts[bucket] += 1
+
+    def write_many(self, logs):
+        raise TypeError("Partitioned output needs the timestamps of the logs, use write_block")
+
+    def close(self):
+        """
+        Flush and close every partition file
+        :return:
+        """
+        while self._writers:
+            self._close(next(iter(self._writers)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def merge_partitions(roots, root, max_size=None):
+    """
+    Put the partitions written by several workers under one root. A partition only one worker wrote is
+    moved; one that several wrote (at the edges of their parts of the series) has their files
+    concatenated in worker order, or with a max_size their parts numbered on so no file grows past it
+    :param roots: partition roots of the workers, in the order of their parts of the series
+    :param root: root of the merged partitions
+    :param max_size: see PartitionedWriter
+    :return: list of merged files
+    """
+    partitions = OrderedDict()
+    for worker, worker_root in enumerate(roots):
+        for directory, _, names in os.walk(worker_root):
+            for name in names:
+                match = _PART.match(name)
+                base = os.path.normpath(os.path.join(os.path.relpath(directory, worker_root), match.group('base')))
+                partitions.setdefault(base, []).append((worker, int(match.group('part') or 0),
+                                                        os.path.join(directory, name), match.group('ext')))
+    paths = []
+    for base, files in partitions.items():
+        files.sort()
+        for number, (_, _, source, extension) in enumerate(files):
+            if number and not max_size:
+                with open(paths[-1], 'ab') as merged, open(source, 'rb') as f_in:
+                    shutil.copyfileobj(f_in, merged, 1024 * 1024)
+                os.remove(source)
+                continue
+            target = os.path.join(root, base + ('.%04d' % number if number else '') + '.log' + extension)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(source, target)
+            paths.append(target)
+    for worker_root in roots:
+        shutil.rmtree(worker_root, ignore_errors=True)
+    return paths
+
+
+def get_root(dest):
+    """
+    Root directory of the partitions of a log file, destination/aws.log -> destination/aws
+    :param dest:
+    :return:
+    """
+    return os.path.splitext(dest)[0]
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Token bucket pacing of realtime logs at a target rate
+"""
+
+import sys
+import math
+import time
+import datetime
+
+PROFILES = ('constant', 'poisson', 'diurnal', 'burst')
+
+# Seconds between two batches of logs
+DEFAULT_TICK = 0.01
+# diurnal: rate swings this much around eps, lowest at 02:00 and highest at 14:00
+DIURNAL_SWING = 0.5
+DIURNAL_LOW = 2 * 60 * 60
+# burst: every BURST_PERIOD seconds the rate is multiplied by BURST_FACTOR for BURST_LENGTH seconds
+BURST_PERIOD = 60
+BURST_LENGTH = 5
+BURST_FACTOR = 10
+
+
+class RateScheduler:
+    """
+    Iterating a scheduler sleeps until the next tick and yields how many logs to send in it, also with async for
+    """
+
+    def __init__(self, eps, burst=None, profile='constant', tick=DEFAULT_TICK, report_interval=10,
+                 report=sys.stderr):
+        """
+        Instance initialisation
+        :param eps: target events per second
+        :param burst: bucket size, most logs sent at once to catch up after falling behind, defaults to one second
+        :param profile: constant, poisson (random arrivals), diurnal (day/night cycle) or burst (periodic spikes)
+        :param tick: seconds between batches
+        :param report_interval: seconds between two target vs achieved reports
+        :param report: stream the reports are written to, None to not report
+        """
+        if profile not in PROFILES:
+            raise ValueError("Unknown rate profile %s, use one of %s" % (profile, ', '.join(PROFILES)))
+        self.eps = eps
+        self.burst = burst if burst else max(1.0, eps)
+        self.profile = profile
+        self.tick = tick
+        self.report_interval = report_interval
+        self.report = report
+        self.sent = 0
+        # logs due since start following the profile, the target the sent count is measured against
+        self.due = 0.0
+        import numpy as np
+        self._random = np.random.default_rng()
+
+    def get_rate(self, now):
+        """
+        Target events per second at a moment, following the profile
+        :param now: datetime
+        :return:
+        """
+        if self.profile == 'diurnal':
+            second = now.hour * 3600 + now.minute * 60 + now.second
+            return self.eps * (1 - DIURNAL_SWING * math.cos(2 * math.pi * (second - DIURNAL_LOW) / 86400))
+        if self.profile == 'burst' and now.timestamp() % BURST_PERIOD < BURST_LENGTH:
+            return self.eps * BURST_FACTOR
+        return self.eps
+
+    def start(self):
+        """
+        Reset the bucket and the schedule to start from now
+        :return:
+        """
+        self._tokens = 0.0
+        self._last = self._next_tick = self._report_at = time.monotonic()
+        self._expected = 0.0
+        self._reported = self.sent
+
+    def wait(self):
+        """
+        Seconds to sleep until the next tick, 0 when behind schedule
+        :return:
+        """
+        self._next_tick += self.tick
+        delay = self._next_tick - time.monotonic()
+        if delay <= 0:
+            # behind schedule, the bucket lets us catch up but ticks are not piled up
+            self._next_tick = time.monotonic()
+        return max(delay, 0)
+
+    def take(self):
+        """
+        How many logs are due at this tick
+        :return:
+        """
+        now = time.monotonic()
+        due = self.get_rate(datetime.datetime.now()) * (now - self._last)
+        self._last = now
+        if self.profile == 'poisson':
+            due = self._random.poisson(due)
+        self._expected += due
+        self.due += due
+        self._tokens = min(self.burst, self._tokens + due)
+        count = int(self._tokens)
+        self._tokens -= count
+        self.sent += count
+
+        if self.report is not None and now - self._report_at >= self.report_interval:
+            elapsed = now - self._report_at
+            self.report.write('target %.0f eps, achieved %.0f eps\n' % (self._expected / elapsed,
+                                                                      (self.sent - self._reported) / elapsed))
+            self.report.flush()
+            self._report_at = now
+            self._expected = 0.0
+            self._reported = self.sent
+        return count
+
+    def __iter__(self):
+        self.start()
+        while True:
+            delay = self.wait()
+            if delay:
+                time.sleep(delay)
+            yield self.take()
+
+    async def __aiter__(self):
+        # same schedule for an event loop, the other tasks run while waiting for the tick
+        import asyncio
+        self.start()
+        while True:
+            await asyncio.sleep(self.wait())
+            yield self.take()
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""
+Generators by their short name
+"""
+
+import importlib
+
+# short name -> (module, class)
+GENERATORS = {
+    'aws': ('aws', 'AWSLogsGenerator'),
+    'fortigate': ('fortigate', 'FortigateLogGenerator'),
+    'sonicwall': ('sonicwall', 'SonicwallLogGenerator'),
+    'mssql': ('mssql', 'MSSQLLogGenerator'),
+    'checkpoint': ('checkpoint', 'CheckpointLogGenerator'),
+}
+
+
+def load_generator(name, **kwargs):
+    """
+    Instantiate a generator by its short name
+    :param name:
+    :param kwargs: generator options, the log file defaults to destination/<name>.log
+    :return:
+    """
+    if name not in GENERATORS:
+        raise ValueError("Unknown generator %s, use one of %s" % (name, ', '.join(GENERATORS)))
+    module, cls = GENERATORS[name]
+    kwargs.setdefault('outdir', 'destination')
+    kwargs.setdefault('filename', name + '.log')
+    return getattr(importlib.import_module(module), cls)(**kwargs)
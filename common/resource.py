@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Line stores of the resource/*.txt files, loaded once per process
+"""
+
+import os
+import mmap
+import random
+from collections.abc import Sequence
+
+RESOURCE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'resource')
+
+# Files from this size on are memory mapped instead of read, the pages are shared with forked workers
+MMAP_THRESHOLD = 64 * 1024 * 1024
+# Bytes scanned for line breaks at once while loading
+SCAN_SIZE = 16 * 1024 * 1024
+
+_STORES = {}
+
+
+class ResourceStore(Sequence):
+    """
+    The lines of a file kept as the raw bytes and one int64 offset per line, a few bytes per line on
+    top of the file itself instead of one python string each. Lines are decoded when they are read.
+    Random picks are O(1): uniform, or weighted through an alias table once weights are set
+    """
+
+    def __init__(self, data):
+        """
+        Instance initialisation, use ResourceStore.load
+        :param data: bytes or mmap of the file
+        """
+        import numpy as np
+
+        self._data = data
+        view = np.frombuffer(data, dtype=np.uint8)
+        # line i is data[starts[i]:starts[i + 1] - 1], a file without a final line break gets one
+        # more start past its end
+        ends = [np.flatnonzero(view[first:first + SCAN_SIZE] == ord('\n')) + (first + 1)
+                for first in range(0, len(view), SCAN_SIZE)]
+        unterminated = len(data) and data[-1:] != b'\n'
+        total = sum(map(len, ends))
+        self._starts = np.empty(total + 1 + unterminated, dtype=np.int64)
+        self._starts[0] = 0
+        if ends:
+            np.concatenate(ends, out=self._starts[1:total + 1])
+        if unterminated:
+            self._starts[-1] = len(data) + 1
+        self._starts.flags.writeable = False
+        del view, ends
+        self._size = len(self._starts) - 1
+        self._probabilities = None
+        self._aliases = None
+
+    @classmethod
+    def load(cls, path, use_mmap=None):
+        """
+        Store of a file
+        :param path:
+        :param use_mmap: memory map the file, by default when it is at least MMAP_THRESHOLD bytes
+        :return: ResourceStore
+        """
+        with open(path, 'rb') as store:
+            if use_mmap is None:
+                use_mmap = os.fstat(store.fileno()).st_size >= MMAP_THRESHOLD
+            if use_mmap:
+                return cls(mmap.mmap(store.fileno(), 0, access=mmap.ACCESS_READ))
+            return cls(store.read())
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(self._size))]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError('resource store index out of range')
+        return self._data[int(self._starts[index]):int(self._starts[index + 1]) - 1].decode('utf-8').rstrip('\r')
+
+    def set_weights(self, weights):
+        """
+        Make choice() pick lines in proportion to weights, None to go back to uniform picks
+        :param weights: one number per line
+        :return: self
+        """
+        if weights is None:
+            self._probabilities = self._aliases = None
+            return self
+        import numpy as np
+
+        weights = np.asarray(weights, dtype=float)
+        if len(weights) != self._size or weights.sum() <= 0 or (weights < 0).any():
+            raise ValueError("Need one non negative weight per line, %d lines" % self._size)
+        # Vose's alias method: every slot keeps its own line with probability p, else its alias
+        scaled = weights * self._size / weights.sum()
+        probabilities = np.ones(self._size)
+        aliases = np.arange(self._size)
+        small = [index for index in range(self._size) if scaled[index] < 1]
+        large = [index for index in range(self._size) if scaled[index] >= 1]
+        while small and large:
+            low, high = small.pop(), large[-1]
+            probabilities[low] = scaled[low]
+            aliases[low] = high
+            scaled[high] -= 1 - scaled[low]
+            if scaled[high] < 1:
+                small.append(large.pop())
+        self._probabilities = probabilities.tolist()
+        self._aliases = aliases.tolist()
+        return self
+
+    def choice(self):
+        """
+        A random line
+        :return: str
+        """
+        index = random.randrange(self._size)
+        if self._aliases is not None and random.random() >= self._probabilities[index]:
+            index = self._aliases[index]
+        return self[index]
+
+    def choices(self, count):
+        """
+        count random lines, picked like choice()
+        :param count:
+        :return: list of str
+        """
+        return [self.choice() for _ in range(count)]
+
+    def sample(self, count):
+        """
+        count distinct random lines, uniformly picked
+        :param count:
+        :return: list of str
+        """
+        return [self[index] for index in random.sample(range(self._size), count)]
+
+
+def get_store(name, use_mmap=None):
+    """
+    The store of a resource file, loaded on first use and kept for the life of the process
+    :param name: file name in resource/
+    :param use_mmap: see ResourceStore.load
+    :return: ResourceStore
+    """
+    store = _STORES.get(name)
+    if store is None:
+        store = _STORES[name] = ResourceStore.load(os.path.join(RESOURCE_DIR, name), use_mmap=use_mmap)
+    return store
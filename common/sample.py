@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Weighted random picks of a generator's sample templates
+"""
+
+import weakref
+
+# Template indexes drawn at once
+DRAW_SIZE = 65536
+
+# Every store of the process, reseeded together by reseed_stores
+_STORES = weakref.WeakSet()
+_SEED = None
+
+
+def parse_weights(spec):
+    """
+    Event type weights from their setup.cfg form, AUDIT_FAILURE=20,ERROR=5
+    :param spec:
+    :return: dict of event type -> weight
+    """
+    weights = {}
+    for part in spec.split(','):
+        if not part.strip():
+            continue
+        # event types may contain spaces (sonicwall messages) but never an =
+        event, separator, weight = part.rpartition('=')
+        if not separator:
+            raise ValueError("Event weight %s is not of the form type=weight" % part.strip())
+        try:
+            weights[event.strip()] = float(weight)
+        except ValueError:
+            raise ValueError("Weight of %s is not a number: %s" % (event.strip(), weight))
+        if weights[event.strip()] < 0:
+            raise ValueError("Weight of %s is negative" % event.strip())
+    return weights
+
+
+class SampleStore:
+    """
+    The templates of a sample file in a numpy object array, picked by index. Indexes are drawn
+    DRAW_SIZE at a time and served from a buffer. Every template is picked as often as its line
+    occurs in the sample, times the weight of its event type
+    """
+
+    def __init__(self, templates, events=None, weights=None, seed=None, key=0):
+        """
+        Instance initialisation
+        :param templates: list of LogTemplate
+        :param events: event type of every template, None for the ones without
+        :param weights: dict of event type -> weight, types not in it weigh 1
+        :param seed: seed of the random stream, defaults to the one last given to reseed_stores
+        :param key: sets apart the streams of stores reseeded with the same seed
+        """
+        import numpy as np
+
+        self._templates = np.empty(len(templates), dtype=object)
+        self._templates[:] = templates
+        self.events = list(events) if events is not None else [None] * len(templates)
+        self.probabilities = None
+        self.key = key
+        self.set_weights(weights)
+        self._random = np.random.default_rng(self._entropy(_SEED if seed is None else seed))
+        self._draws = np.empty(0, dtype=np.intp)
+        self._next = 0
+        _STORES.add(self)
+
+    def __len__(self):
+        return len(self._templates)
+
+    def set_weights(self, weights):
+        """
+        Weigh the event types, None or {} to pick every template alike
+        :param weights: dict of event type -> weight
+        :return: self
+        """
+        if not weights:
+            self.probabilities = None
+            return self
+        import numpy as np
+
+        probabilities = np.array([weights.get(event, 1.0) for event in self.events], dtype=float)
+        if not probabilities.sum():
+            raise ValueError("Event weights %s leave no template to pick" % weights)
+        self.probabilities = probabilities / probabilities.sum()
+        return self
+
+    def _entropy(self, seed):
+        return [seed, self.key] if self.key and seed is not None else seed
+
+    def reseed(self, seed):
+        """
+        Start a new random stream
+        :param seed:
+        :return:
+        """
+        import numpy as np
+        self._random = np.random.default_rng(self._entropy(seed))
+        self._draws = np.empty(0, dtype=np.intp)
+        self._next = 0
+
+    def draw(self, count):
+        """
+        count random template indexes
+        :param count:
+        :return: numpy array
+        """
+        import numpy as np
+
+        missing = count - (len(self._draws) - self._next)
+        if missing > 0:
+            # always drawn DRAW_SIZE at a time, so the picks of a seeded stream do not depend on how
+            # many were asked for at once
+            chunks = -(-missing // DRAW_SIZE)
+            self._draws = np.concatenate([self._draws[self._next:]] + [
+                self._random.choice(len(self._templates), DRAW_SIZE, p=self.probabilities) for _ in range(chunks)])
+            self._next = 0
+        self._next += count
+        return self._draws[self._next - count:self._next]
+
+    def choices(self, count):
+        """
+        count random templates
+        :param count:
+        :return: list of LogTemplate
+        """
+        return self._templates[self.draw(count)].tolist()
+
+    def choice(self):
+        return self.choices(1)[0]
+
+
+def reseed_stores(seed):
+    """
+    Reseed every store of the process, and the ones made later, see common.seeding
+    :param seed: int, None for fresh entropy
+    :return:
+    """
+    global _SEED
+    _SEED = seed
+    for store in list(_STORES):
+        store.reseed(seed)
+
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Reproducible random streams from one run seed
+"""
+
+import random
+import zlib
+
+# Streams derived from the run seed, see derive
+IDENTITIES = 1
+GENERATOR = 2
+BLOCK = 3
+REALTIME = 4
+MIX = 5
+TIMES = 6
+
+_SEED = None
+
+
+def set_seed(seed):
+    """
+    Seed of the whole run, None for fresh entropy. The identity pool is made again from it
+    :param seed: int
+    :return:
+    """
+    global _SEED
+    if seed == _SEED:
+        return
+    _SEED = seed
+    from common import identity
+    identity.reset_identity_pool()
+
+
+def get_seed():
+    return _SEED
+
+
+def derive(*keys):
+    """
+    Seed of one stream of the run, independent of every other stream (numpy SeedSequence)
+    :param keys: ints naming the stream, e.g. (BLOCK, generator stream, block number)
+    :return: int, None when the run has no seed
+    """
+    if _SEED is None:
+        return None
+    import numpy as np
+    return int(np.random.SeedSequence([_SEED] + list(keys)).generate_state(1)[0])
+
+
+def get_stream(name):
+    """
+    Number of a generator's streams, stable across runs and processes
+    :param name: generator class name
+    :return: int
+    """
+    return zlib.crc32(name.encode('utf-8'))
+
+
+def seed_streams(seed):
+    """
+    Reseed every random stream a generator draws from: the random module, the identity pool picks, the
+    ip pool and the sample template picks. Faker needs none, the identity pool seeds its own for every user
+    :param seed: int, None for fresh entropy
+    :return:
+    """
+    from common.identity import get_identity_pool
+    from common.ip_pool import CIDRPool, get_ip_pool
+    from common.sample import reseed_stores
+
+    random.seed(seed)
+    get_identity_pool().reseed(seed)
+    if isinstance(get_ip_pool(), CIDRPool):
+        get_ip_pool().reseed(seed)
+    reseed_stores(seed)
+
+
+def seed_block(stream, number):
+    """
+    Reseed the streams for one block of a generator's time series, so a block is the same whatever
+    was generated before it in the process. Does nothing when the run has no seed
+    :param stream: see get_stream
+    :param number: block number
+    :return: True when the streams were seeded
+    """
+    if _SEED is None:
+        return False
+    seed_streams(derive(BLOCK, stream, number))
+    return True
@@ -0,0 +1,424 @@
+# -*- coding: utf-8 -*-
+"""
+Syslog senders over UDP, TCP and TLS
+"""
+
+import os
+import ssl
+import time
+import socket
+import ctypes
+import ctypes.util
+from functools import lru_cache
+
+DEFAULT_BATCH_SIZE = 256
+
+TRANSPORTS = ('UDP', 'TCP', 'TLS')
+# RFC 6587: octet counting ("<length> <message>") or non transparent framing (message ended by a newline)
+FRAMINGS = ('octet', 'newline')
+
+# TCP writes are coalesced up to this many bytes per send call
+DEFAULT_COALESCE_SIZE = 64 * 1024
+# Reconnects wait RECONNECT_DELAY, doubled after every failure up to RECONNECT_MAX_DELAY. A chunk is
+# dropped after RECONNECT_ATTEMPTS failed tries
+RECONNECT_DELAY = 0.1
+RECONNECT_MAX_DELAY = 30
+RECONNECT_ATTEMPTS = 5
+CONNECT_TIMEOUT = 10
+
+# Open senders per destination and settings, see open_sender
+_POOL = {}
+
+
+class _IOVec(ctypes.Structure):
+    _fields_ = [('iov_base', ctypes.c_void_p), ('iov_len', ctypes.c_size_t)]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ('msg_name', ctypes.c_void_p),
+        ('msg_namelen', ctypes.c_uint32),
+        ('msg_iov', ctypes.POINTER(_IOVec)),
+        ('msg_iovlen', ctypes.c_size_t),
+        ('msg_control', ctypes.c_void_p),
+        ('msg_controllen', ctypes.c_size_t),
+        ('msg_flags', ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [('msg_hdr', _MsgHdr), ('msg_len', ctypes.c_uint)]
+
+
+@lru_cache(maxsize=None)
+def _load_sendmmsg():
+    """
+    libc sendmmsg(2), None where it is not available (not Linux, no glibc). Looked up on first use,
+    finding libc is slow enough to show in the start up time
+    :return:
+    """
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        sendmmsg = libc.sendmmsg
+    except (OSError, AttributeError, TypeError):
+        return None
+    sendmmsg.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int]
+    sendmmsg.restype = ctypes.c_int
+    return sendmmsg
+
+
+class BaseSender:
+    """
+    Counters shared by every sender: messages, bytes and errors in total and over the last second
+    """
+
+    def __init__(self):
+        self.sent = 0
+        self.bytes = 0
+        self.errors = 0
+        self.last_second = {'sent': 0, 'bytes': 0, 'errors': 0}
+        self._second = int(time.monotonic())
+        self._second_start = (0, 0, 0)
+
+    def send(self, message):
+        """
+        Send one message right away
+        :param message: str
+        :return:
+        """
+        self.send_many([message])
+
+    def send_many(self, messages):
+        """
+        Encode and send a list of messages
+        :param messages: list of str
+        :return:
+        """
+        self.send_payloads([message.encode('utf-8') for message in messages])
+
+    def send_payloads(self, payloads):
+        raise NotImplementedError
+
+    def _tick(self):
+        """
+        Roll the per second counters
+        :return:
+        """
+        second = int(time.monotonic())
+        if second != self._second:
+            sent, sent_bytes, errors = self._second_start
+            self.last_second = {'sent': self.sent - sent, 'bytes': self.bytes - sent_bytes,
+                                'errors': self.errors - errors}
+            self._second = second
+            self._second_start = (self.sent, self.bytes, self.errors)
+
+    def close(self):
+        raise NotImplementedError
+
+
+class UDPSender(BaseSender):
+    """
+    A class sending syslog messages to one destination, resolved once. Messages are sent batch_size
+    at a time with a single sendmmsg call, or a tight send loop where sendmmsg is not available
+    """
+
+    def __init__(self, host, port, batch_size=DEFAULT_BATCH_SIZE, use_sendmmsg=True):
+        """
+        Instance initialisation
+        :param host:
+        :param port:
+        :param batch_size: messages per sendmmsg call
+        :param use_sendmmsg: False to always send one message per syscall
+        """
+        super().__init__()
+        family, kind, proto, _, address = socket.getaddrinfo(host, int(port), type=socket.SOCK_DGRAM)[0]
+        self.address = address
+        self.batch_size = batch_size
+        self._socket = socket.socket(family, kind, proto)
+        self._socket.connect(address)
+        self._sendmmsg = _load_sendmmsg() if use_sendmmsg else None
+        self._messages = (_MMsgHdr * batch_size)()
+        self._vectors = (_IOVec * batch_size)()
+        for index in range(batch_size):
+            self._messages[index].msg_hdr.msg_iov = ctypes.pointer(self._vectors[index])
+            self._messages[index].msg_hdr.msg_iovlen = 1
+
+    def send_payloads(self, payloads):
+        """
+        Send a list of encoded messages
+        :param payloads: list of bytes
+        :return:
+        """
+        for first in range(0, len(payloads), self.batch_size):
+            batch = payloads[first:first + self.batch_size]
+            if self._sendmmsg is not None:
+                self._send_batch(batch)
+            else:
+                self._send_loop(batch)
+        self._tick()
+
+    def _send_loop(self, payloads):
+        """
+        One send call per message
+        :param payloads: list of bytes
+        :return:
+        """
+        send = self._socket.send
+        for payload in payloads:
+            try:
+                send(payload)
+            except OSError:
+                self.errors += 1
+                continue
+            self.sent += 1
+            self.bytes += len(payload)
+
+    def _send_batch(self, payloads):
+        """
+        Send up to batch_size messages with sendmmsg
+        :param payloads: list of bytes
+        :return:
+        """
+        # one buffer for the batch, every iovec points into it
+        buffer = b''.join(payloads)
+        base = ctypes.cast(ctypes.c_char_p(buffer), ctypes.c_void_p).value
+        offset = 0
+        for vector, payload in zip(self._vectors, payloads):
+            vector.iov_base = base + offset
+            vector.iov_len = len(payload)
+            offset += len(payload)
+
+        fd = self._socket.fileno()
+        messages = ctypes.addressof(self._messages)
+        first = 0
+        while first < len(payloads):
+            done = self._sendmmsg(fd, messages + first * ctypes.sizeof(_MMsgHdr), len(payloads) - first, 0)
+            if done < 0:
+                # the message at first failed (e.g. ECONNREFUSED from an earlier datagram), skip it
+                self.errors += 1
+                done = 1
+            else:
+                self.sent += done
+                self.bytes += sum(map(len, payloads[first:first + done]))
+            first += done
+
+    def close(self):
+        """
+        Close the socket
+        :return:
+        """
+        self._socket.close()
+
+
+class StreamSender(BaseSender):
+    """
+    A class sending framed syslog messages over persistent TCP (or TLS) connections. Messages of a call are
+    framed into one buffer and written in chunks of up to coalesce_size bytes, spread round robin over
+    pool_size connections. A broken connection is opened again with exponential backoff.
+    Backpressure is accounted in stalls (writes the receiver could not take at once) and blocked (seconds
+    spent waiting on it)
+    """
+
+    def __init__(self, host, port, framing='octet', pool_size=1, coalesce_size=DEFAULT_COALESCE_SIZE,
+                 ssl_context=None):
+        """
+        Instance initialisation
+        :param host:
+        :param port:
+        :param framing: octet or newline, see FRAMINGS
+        :param pool_size: connections kept open to the destination
+        :param coalesce_size: most bytes written per send call
+        :param ssl_context: ssl.SSLContext to speak TLS, None for plain TCP
+        """
+        super().__init__()
+        if framing not in FRAMINGS:
+            raise ValueError("Unknown framing %s, use one of %s" % (framing, ', '.join(FRAMINGS)))
+        self.host = host
+        self.port = int(port)
+        self.framing = framing
+        self.coalesce_size = coalesce_size
+        self.ssl_context = ssl_context
+        self._connections = [None] * max(1, pool_size)
+        self._next = 0
+        self._delay = RECONNECT_DELAY
+
+        self.connects = 0
+        self.stalls = 0
+        self.blocked = 0.0
+
+    def frame(self, payload):
+        """
+        Frame one encoded message
+        :param payload: bytes
+        :return: bytes
+        """
+        if self.framing == 'octet':
+            return b'%d %s' % (len(payload), payload)
+        return payload + b'\n'
+
+    def send_payloads(self, payloads):
+        """
+        Frame and send a list of encoded messages
+        :param payloads: list of bytes
+        :return:
+        """
+        chunk, size = [], 0
+        for payload in payloads:
+            framed = self.frame(payload)
+            chunk.append(framed)
+            size += len(framed)
+            if size >= self.coalesce_size:
+                self._write(b''.join(chunk), len(chunk))
+                chunk, size = [], 0
+        if chunk:
+            self._write(b''.join(chunk), len(chunk))
+        self._tick()
+
+    def _connect(self):
+        """
+        Open a connection, TLS wrapped when there is an ssl context
+        :return: socket
+        """
+        connection = socket.create_connection((self.host, self.port), timeout=CONNECT_TIMEOUT)
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.ssl_context is not None:
+            connection = self.ssl_context.wrap_socket(connection, server_hostname=self.host)
+        connection.settimeout(None)
+        self.connects += 1
+        self._delay = RECONNECT_DELAY
+        return connection
+
+    def _write(self, data, count):
+        """
+        Write one coalesced chunk on the next connection of the pool
+        :param data: bytes
+        :param count: messages in data
+        :return: True when it was written
+        """
+        for _ in range(RECONNECT_ATTEMPTS):
+            index = self._next
+            try:
+                if self._connections[index] is None:
+                    self._connections[index] = self._connect()
+                self._write_all(self._connections[index], data)
+            except OSError:
+                self._discard(index)
+                time.sleep(self._delay)
+                self._delay = min(self._delay * 2, RECONNECT_MAX_DELAY)
+                continue
+            self._next = (index + 1) % len(self._connections)
+            self.sent += count
+            self.bytes += len(data)
+            return True
+        self.errors += count
+        return False
+
+    def _write_all(self, connection, data):
+        """
+        sendall, counting every time the receiver did not take the whole rest at once
+        :param connection:
+        :param data:
+        :return:
+        """
+        view = memoryview(data)
+        started = time.perf_counter()
+        while view:
+            written = connection.send(view)
+            if written < len(view):
+                self.stalls += 1
+            view = view[written:]
+        self.blocked += time.perf_counter() - started
+
+    def _discard(self, index):
+        """
+        Drop a broken connection of the pool
+        :param index:
+        :return:
+        """
+        connection = self._connections[index]
+        self._connections[index] = None
+        if connection is not None:
+            try:
+                connection.close()
+            except OSError:
+                pass
+
+    def close(self):
+        """
+        Close every connection of the pool once the collector read everything. A socket closed with
+        unread data (like TLS session tickets) is reset, which loses what the collector did not read yet
+        :return:
+        """
+        for index, connection in enumerate(self._connections):
+            if connection is not None:
+                try:
+                    connection.shutdown(socket.SHUT_WR)
+                    connection.settimeout(CONNECT_TIMEOUT)
+                    while connection.recv(4096):
+                        pass
+                except OSError:
+                    pass
+            self._discard(index)
+
+
+def get_ssl_context(ca_file=None, verify=True):
+    """
+    Client TLS context
+    :param ca_file: certificates to trust, the system ones when not given
+    :param verify: False to accept any certificate (self signed test collectors)
+    :return: ssl.SSLContext
+    """
+    context = ssl.create_default_context(cafile=ca_file or None)
+    if not verify:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def open_sender(transport, host, port, batch_size=DEFAULT_BATCH_SIZE, framing='octet', pool_size=1,
+                ca_file=None, verify=True):
+    """
+    Sender for a transport, one per destination, settings and process so every generator shares its
+    connections. Only the settings of the transport tell senders apart, e.g. batch_size for UDP
+    :param transport: UDP, TCP or TLS, see TRANSPORTS
+    :param host:
+    :param port:
+    :param batch_size: UDP messages per sendmmsg call
+    :param framing: TCP and TLS framing, see FRAMINGS
+    :param pool_size: TCP and TLS connections to keep open
+    :param ca_file: TLS certificates to trust
+    :param verify: TLS certificate verification
+    :return: UDPSender or StreamSender
+    """
+    transport = transport.upper()
+    if transport not in TRANSPORTS:
+        raise ValueError("Unknown syslog transport %s, use one of %s" % (transport, ', '.join(TRANSPORTS)))
+    if transport == 'UDP':
+        settings = (batch_size,)
+    else:
+        settings = (framing, pool_size) + ((ca_file, verify) if transport == 'TLS' else ())
+    # a forked worker opens its own
+    key = (os.getpid(), transport, host, int(port)) + settings
+    sender = _POOL.get(key)
+    if sender is None:
+        if transport == 'UDP':
+            sender = UDPSender(host, port, batch_size=batch_size)
+        else:
+            sender = StreamSender(host, port, framing=framing, pool_size=pool_size,
+                                  ssl_context=get_ssl_context(ca_file, verify) if transport == 'TLS' else None)
+        _POOL[key] = sender
+    return sender
+
+
+def open_syslog_sender(read, batch_size=None):
+    """
+    Sender for the syslog collector in the [syslog] section of setup.cfg
+    :param read: ConfigReader.read
+    :param batch_size: UDP messages per sendmmsg call, defaults to batch_size in setup.cfg
+    :return: (UDPSender or StreamSender, its destination label transport://host:port)
+    """
+    sender = open_sender(read('syslog', 'type'), read('syslog', 'host'), read('syslog', 'port'),
+                         batch_size=batch_size or int(read('syslog', 'batch_size')),
+                         framing=read('syslog', 'framing'), pool_size=int(read('syslog', 'pool_size')),
+                         ca_file=read('syslog', 'ca_file'), verify=read('syslog', 'verify').lower() == 'true')
+    return sender, '%s://%s:%s' % (read('syslog', 'type').lower(), read('syslog', 'host'), read('syslog', 'port'))
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Between dates generation split over several processes
+"""
+
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from common.compression import EXTENSIONS
+from common.partition import get_root, merge_partitions
+from common.spool import get_spool_path, merge_spools
+from common import seeding
+
+
+def get_shards(count, workers, first=0):
+    """
+    Split count logs into contiguous parts, one per worker
+    :param count:
+    :param workers:
+    :param first: index of the first log
+    :return: list of (first, last) index pairs
+    """
+    bounds = [first + count * shard // workers for shard in range(workers + 1)]
+    return [(bounds[shard], bounds[shard + 1]) for shard in range(workers) if bounds[shard] < bounds[shard + 1]]
+
+
+def get_shard_dest(dest, shard):
+    """
+    Log file of one shard, aws.log -> aws.0003.log
+    :param dest:
+    :param shard:
+    :return:
+    """
+    root, ext = os.path.splitext(dest)
+    return '%s.%04d%s' % (root, shard, ext)
+
+
+def generate_shard(generator, shard, first, last, entropy):
+    """
+    Runs in the worker process, generates one part of the time series into its own file
+    :param generator: generator instance, pickled over from the parent
+    :param shard: shard number
+    :param first: index of the first log
+    :param last: index after the last log
+    :param entropy: seed of this shard's random streams when the run has no seed
+    :return: path of the written file, or root of the written partitions, or the written spool
+    """
+    seeding.set_seed(generator.seed)
+    if generator.seed is None:
+        # forked workers would otherwise all continue the parent's streams
+        seeding.seed_streams(entropy)
+    generator.dest = get_shard_dest(generator.dest, shard)
+    generator.echo = False
+    generator.generate_between_dates(first, last)
+    if generator.spool:
+        return get_spool_path(generator.dest)
+    if generator.partition or generator.max_size:
+        return get_root(generator.dest)
+    return generator.dest + EXTENSIONS[generator.compression]
+
+
+def generate_sharded(generator, workers, split=False, first=0, last=None):
+    """
+    Generate between dates with a pool of processes. Every worker gets a contiguous part of the
+    time series. With a seed on the generator every block is seeded on its own, so the output does not
+    depend on the number of workers; without one every worker gets independent fresh streams.
+    The parts are appended in order into the generator's log file as they finish, which keeps it
+    time ordered; compressed parts are whole gzip/zstd/lz4 members so they can be concatenated as they are.
+    Partitioned output is merged partition by partition, see merge_partitions, and spools with their
+    indexes, see merge_spools
+    :param generator: configured generator instance
+    :param workers: number of processes
+    :param split: keep one file per shard instead of merging them
+    :param first: index of the first log of the series to generate
+    :param last: index after the last one, defaults to count
+    :return: list of written files
+    """
+    last = generator.count if last is None else last
+    shards = get_shards(last - first, workers, first)
+    entropies = [int(child.generate_state(1)[0]) for child in np.random.SeedSequence().spawn(len(shards))]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(generate_shard, generator, shard, first, last, entropies[shard])
+            for shard, (first, last) in enumerate(shards)
+        ]
+        if split:
+            return [future.result() for future in futures]
+        if generator.spool:
+            return [merge_spools([future.result() for future in futures], get_spool_path(generator.dest))]
+        if generator.partition or generator.max_size:
+            # partitions at the edges of the shards were written by two workers
+            return merge_partitions([future.result() for future in futures], get_root(generator.dest),
+                                    generator.max_size)
+
+        path = generator.dest + EXTENSIONS[generator.compression]
+        with open(path, 'wb') as merged:
+            for future in futures:
+                part = future.result()
+                with open(part, 'rb') as f_in:
+                    shutil.copyfileobj(f_in, merged, 1024 * 1024)
+                os.remove(part)
+        return [path]
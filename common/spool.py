@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+"""
+Spool of encoded syslog payloads written once between dates and replayed at a high rate
+
+A spool is two files:
+    aws.spool      magic, length prefixed json metadata, then every log as a length prefixed utf-8 payload
+    aws.spool.idx  one (offset, length, kind) record per log, see _INDEX, so any log is found without a scan
+The kind of a log is the generator it came from, its metadata tells where the syslog header timestamp
+of that generator's logs is so a replay can put the current time in it
+"""
+
+import os
+import json
+import mmap
+import time
+import shutil
+import struct
+import datetime
+import itertools
+
+from common.writer import DEFAULT_BUFFER_SIZE
+
+SPOOL_EXTENSION = '.spool'
+INDEX_EXTENSION = '.idx'
+
+# Logs read from the spool and sent at once when replaying without a rate
+REPLAY_CHUNK = 4096
+
+_MAGIC = b'LOGSPL1\n'
+_LENGTH = struct.Struct('>I')
+# numpy dtype of an index record: where the payload starts, its length and its kind
+_INDEX = [('offset', '<i8'), ('length', '<u4'), ('kind', 'u1')]
+
+
+def get_spool_path(dest):
+    """
+    Spool of a log file, destination/aws.log -> destination/aws.spool
+    :param dest:
+    :return:
+    """
+    return os.path.splitext(dest)[0] + SPOOL_EXTENSION
+
+
+class SpoolWriter:
+    """
+    A class writing logs to a spool, encoded and length prefixed block by block, and their index next to it
+    """
+
+    def __init__(self, path, headers, names, buffer_size=DEFAULT_BUFFER_SIZE):
+        """
+        Instance initialisation
+        :param path: spool file, see get_spool_path
+        :param headers: per kind, (offset, strftime format) of the header timestamp of its logs, or None
+        :param names: per kind, the name of the generator
+        :param buffer_size: bytes to collect before every write
+        """
+        import numpy as np
+
+        if len(headers) > 256:
+            raise ValueError("A spool holds the logs of at most 256 generators")
+        self.path = path
+        self.buffer_size = buffer_size
+        self.lines = 0
+        self.bytes = 0
+        self._dtype = np.dtype(_INDEX)
+        self._pending = []
+        self._records = []
+        self._size = 0
+        meta = json.dumps({'headers': [list(header) if header else None for header in headers],
+                           'names': list(names)}).encode('utf-8')
+        self._spool = open(path, 'wb')
+        self._index = open(path + INDEX_EXTENSION, 'wb')
+        self._spool.write(_MAGIC + _LENGTH.pack(len(meta)) + meta)
+        self._offset = self._spool.tell()
+
+    def write_block(self, block, logs, kinds=None):
+        """
+        Add the logs of a block of timestamps
+        :param block: timestamps of the logs
+        :param logs: list of str
+        :param kinds: per log its kind, numpy array or None when they are all kind 0
+        :return:
+        """
+        import numpy as np
+
+        if not logs:
+            return
+        payloads = [log.encode('utf-8') for log in logs]
+        lengths = np.fromiter(map(len, payloads), dtype=np.int64, count=len(payloads))
+        records = np.empty(len(payloads), dtype=self._dtype)
+        # every payload starts after its own prefix and everything before it
+        records['offset'] = self._offset + np.cumsum(lengths + _LENGTH.size) - lengths
+        records['length'] = lengths
+        records['kind'] = 0 if kinds is None else kinds
+        data = b''.join(itertools.chain.from_iterable(zip(map(_LENGTH.pack, lengths.tolist()), payloads)))
+        self._offset += len(data)
+        self._pending.append(data)
+        self._records.append(records)
+        self._size += len(data)
+        self.lines += len(payloads)
+        if self._size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write everything collected so far
+        :return:
+        """
+        if not self._pending:
+            return
+        self._spool.write(b''.join(self._pending))
+        for records in self._records:
+            self._index.write(records.tobytes())
+        self.bytes += self._size
+        self._pending.clear()
+        self._records.clear()
+        self._size = 0
+
+    def close(self):
+        """
+        Flush and close the spool and its index
+        :return:
+        """
+        if self._spool is not None:
+            self.flush()
+            self._spool.close()
+            self._index.close()
+            self._spool = self._index = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _read_meta(spool):
+    """
+    Metadata of an open spool, left positioned at its first record
+    :param spool: file opened in binary mode
+    :return: dict, offset of the first record
+    """
+    if spool.read(len(_MAGIC)) != _MAGIC:
+        raise ValueError("%s is not a spool" % spool.name)
+    size, = _LENGTH.unpack(spool.read(_LENGTH.size))
+    return json.loads(spool.read(size).decode('utf-8')), len(_MAGIC) + _LENGTH.size + size
+
+
+def build_index(path):
+    """
+    Write the index of a spool again from its length prefixes, every log gets kind 0
+    :param path: spool file
+    :return: number of logs
+    """
+    import numpy as np
+
+    dtype = np.dtype(_INDEX)
+    count = 0
+    with open(path, 'rb') as spool, open(path + INDEX_EXTENSION, 'wb') as index:
+        _, offset = _read_meta(spool)
+        size = os.fstat(spool.fileno()).st_size
+        with mmap.mmap(spool.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            records = []
+            while offset < size:
+                length, = _LENGTH.unpack_from(data, offset)
+                records.append((offset + _LENGTH.size, length, 0))
+                offset += _LENGTH.size + length
+                if len(records) >= REPLAY_CHUNK:
+                    index.write(np.array(records, dtype=dtype).tobytes())
+                    count += len(records)
+                    records = []
+            index.write(np.array(records, dtype=dtype).tobytes())
+    return count + len(records)
+
+
+def merge_spools(parts, path):
+    """
+    Append spools written by several workers into one, their logs in the order of the parts
+    :param parts: spool files, all with the same metadata
+    :param path: merged spool file
+    :return: path
+    """
+    import numpy as np
+
+    dtype = np.dtype(_INDEX)
+    with open(path, 'wb') as merged, open(path + INDEX_EXTENSION, 'wb') as index:
+        for number, part in enumerate(parts):
+            with open(part, 'rb') as f_in:
+                _, start = _read_meta(f_in)
+                # the metadata is written once, a record moves by how much more comes before it
+                shift = merged.tell() - start if number else 0
+                f_in.seek(start if number else 0)
+                shutil.copyfileobj(f_in, merged, 1024 * 1024)
+            records = np.fromfile(part + INDEX_EXTENSION, dtype=dtype)
+            records['offset'] += shift
+            index.write(records.tobytes())
+            os.remove(part)
+            os.remove(part + INDEX_EXTENSION)
+    return path
+
+
+class Spool:
+    """
+    A spool mapped in memory: the payloads of any range of its logs are byte slices of the map, so
+    replaying costs no template, formatting or encoding work
+    """
+
+    def __init__(self, path):
+        """
+        Instance initialisation, the index is built again when it is missing
+        :param path: spool file
+        """
+        import numpy as np
+
+        self.path = path
+        if not os.path.exists(path + INDEX_EXTENSION):
+            build_index(path)
+        with open(path, 'rb') as spool:
+            meta, _ = _read_meta(spool)
+            self._map = mmap.mmap(spool.fileno(), 0, access=mmap.ACCESS_READ)
+        self.headers = [tuple(header) if header else None for header in meta['headers']]
+        self.names = meta['names']
+        if os.path.getsize(path + INDEX_EXTENSION):
+            self.index = np.memmap(path + INDEX_EXTENSION, dtype=np.dtype(_INDEX), mode='r')
+        else:
+            self.index = np.empty(0, dtype=np.dtype(_INDEX))
+
+    def get_name(self):
+        """
+        Source label of the replayed logs in the metrics
+        :return:
+        """
+        return '+'.join(self.names)
+
+    def __len__(self):
+        return len(self.index)
+
+    def payloads(self, first, last, now=None):
+        """
+        Encoded logs of a range of the spool
+        :param first: index of the first log
+        :param last: index after the last log
+        :param now: datetime to put in the header timestamp of every log, None to leave the logs as they are
+        :return: list of bytes
+        """
+        records = self.index[first:last]
+        data = self._map
+        offsets, lengths = records['offset'].tolist(), records['length'].tolist()
+        if now is None:
+            return [data[offset:offset + length] for offset, length in zip(offsets, lengths)]
+        # the header formats are fixed width, so only those bytes change
+        stamps = [(header[0], now.strftime(header[1]).encode('utf-8')) if header else None
+                  for header in self.headers]
+        payloads = []
+        for offset, length, kind in zip(offsets, lengths, records['kind'].tolist()):
+            stamp = stamps[kind]
+            if stamp is None or length < stamp[0] + len(stamp[1]):
+                payloads.append(data[offset:offset + length])
+                continue
+            at, text = stamp
+            payloads.append(data[offset:offset + at] + text + data[offset + at + len(text):offset + length])
+        return payloads
+
+    def close(self):
+        self._map.close()
+        self.index = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def replay(spool, sender, eps=None, burst=None, profile='constant', count=None, loop=False, rewrite=False,
+           chunk=REPLAY_CHUNK):
+    """
+    Send the logs of a spool in order, paced like live logs with a target eps or as fast as the sender
+    takes them. The time spent reading them from the spool is counted in the create stage of the
+    process metrics, see common.metrics
+    :param spool: Spool
+    :param sender: UDPSender or StreamSender
+    :param eps: target logs per second, None for no limit
+    :param burst: see RateScheduler
+    :param profile: see RateScheduler
+    :param count: logs to send, default the whole spool or forever when looping
+    :param loop: start the spool over once it is all sent
+    :param rewrite: put the current time in the header timestamp of every log
+    :param chunk: logs sent at once without eps
+    :return: number of logs sent
+    """
+    from common.metrics import SourceMetrics, get_metrics
+
+    total = len(spool)
+    if not total:
+        return 0
+    if count is None and not loop:
+        count = total
+    metrics = SourceMetrics(get_metrics(), spool.get_name())
+    forward = metrics.stage('forward')
+    if eps:
+        from common.rate import RateScheduler
+        # the stats line reports the target eps
+        ticks = RateScheduler(eps, burst=burst, profile=profile, report=None)
+        metrics.paced(ticks)
+    else:
+        ticks = itertools.repeat(chunk)
+    sent = position = 0
+    for due in ticks:
+        if count is not None:
+            due = min(due, count - sent)
+        while due:
+            last = min(position + due, total)
+            started = time.perf_counter()
+            payloads = spool.payloads(position, last, datetime.datetime.now() if rewrite else None)
+            read = time.perf_counter()
+            sender.send_payloads(payloads)
+            forwarded = time.perf_counter()
+            metrics.created(payloads, read - started)
+            forward.observe(forwarded - read)
+            metrics.latency.observe(forwarded - started, len(payloads))
+            sent += len(payloads)
+            due -= len(payloads)
+            position = last % total if loop else last
+            if position == total:
+                return sent
+        if count is not None and sent >= count:
+            return sent
+    return sent
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Pre-parsed log templates, so a sample line is only scanned by regexes once
+"""
+
+import re
+
+# Placeholders used inside replacement strings, e.g. 'srcip={srcip}'
+_FIELD = re.compile(r'{(\w+)}')
+# While a line is parsed each slot is stood in for by one private use character, which
+# never occurs in the samples and is neither a digit nor a word character for the rules
+_MARK = 0xE000
+_SLOT = re.compile('([\ue000-\uf8ff])')
+
+
+class Rule:
+    """
+    A single substitution, the same thing the generators used to do with re.sub
+    """
+
+    def __init__(self, pattern, replacement):
+        """
+        Instance initialisation
+        :param pattern: compiled regex (or pattern string) to look for
+        :param replacement: text to put instead, {name} marks a value filled in per line
+        """
+        self.pattern = re.compile(pattern)
+        self.replacement = replacement
+        self.fields = _FIELD.findall(replacement)
+
+    def apply(self, string, values):
+        """
+        Substitute the rule directly on a string with the given values
+        :param string:
+        :param values: dict of field name to value
+        :return: updated string
+        """
+        new = self.replacement.format(**values) if self.fields else self.replacement
+        return self.pattern.sub(lambda match: new, string)
+
+
+class LogTemplate:
+    """
+    A sample log line broken into literal segments and named slots
+    """
+
+    __slots__ = ('parts', 'slots', 'source')
+
+    def __init__(self, line, rules):
+        """
+        Parse the line once, applying every rule in order exactly like a chain of re.sub would
+        :param line: raw sample line
+        :param rules: ordered list of Rule
+        """
+        self.source = line
+        names = []
+
+        def mark(rule):
+            def repl(match):
+                parts = []
+                last = 0
+                for field in _FIELD.finditer(rule.replacement):
+                    parts.append(rule.replacement[last:field.start()])
+                    parts.append(chr(_MARK + len(names)))
+                    names.append(field.group(1))
+                    last = field.end()
+                parts.append(rule.replacement[last:])
+                return ''.join(parts)
+            return repl
+
+        for rule in rules:
+            line = rule.pattern.sub(mark(rule), line)
+
+        pieces = _SLOT.split(line)
+        # split() alternates literal, marker, literal ... and always starts and ends with a literal
+        self.parts = pieces
+        self.slots = tuple((index, names[ord(pieces[index]) - _MARK]) for index in range(1, len(pieces), 2))
+
+    def render(self, values):
+        """
+        Fill every slot from values and join
+        :param values: dict of field name to value
+        :return: log line
+        """
+        parts = self.parts[:]
+        for index, name in self.slots:
+            parts[index] = values[name]
+        return ''.join(parts)
+
+
+def compile_templates(lines, rules):
+    """
+    Parse all sample lines into templates, line breaks are left to whoever writes the logs
+    :param lines: raw sample lines
+    :param rules: ordered list of Rule
+    :return: list of LogTemplate
+    """
+    return [LogTemplate(line.rstrip('\n'), rules) for line in lines]
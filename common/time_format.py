@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+strftime for whole blocks of timestamps at once
+"""
+
+import re
+import datetime
+
+import numpy as np
+
+from utils import EPOCH
+
+_DIRECTIVE = re.compile('%.')
+# Directives that only depend on the time of day
+_TIME_DIRECTIVES = {'%H', '%I', '%M', '%S', '%p', '%%'}
+_UNIX = datetime.datetime(1970, 1, 1)
+_SECONDS_PER_DAY = 24 * 60 * 60
+
+# Time of day format -> numpy array of the 86400 formatted seconds of a day
+_TIME_TABLES = {}
+
+
+def split_format(str_format):
+    """
+    Split a strftime format into the part that depends on the day and the time of day part after it,
+    '%Y-%m-%dT%H:%M:%SZ' -> ('%Y-%m-%dT', '%H:%M:%SZ')
+    :param str_format:
+    :return: tuple, None if the format mixes them in some other way
+    """
+    directives = list(_DIRECTIVE.finditer(str_format))
+    times = [match for match in directives if match.group() in _TIME_DIRECTIVES - {'%%'}]
+    if not times:
+        return str_format, ''
+    split = times[0].start()
+    if any(match.group() not in _TIME_DIRECTIVES for match in directives if match.start() >= split):
+        return None
+    return str_format[:split], str_format[split:]
+
+
+def get_time_table(str_format):
+    """
+    Every second of a day formatted with a time of day format, built once per format
+    :param str_format:
+    :return: numpy object array indexed by second of the day
+    """
+    table = _TIME_TABLES.get(str_format)
+    if table is None:
+        table = np.array([(_UNIX + datetime.timedelta(seconds=second)).strftime(str_format)
+                          for second in range(_SECONDS_PER_DAY)], dtype=object)
+        _TIME_TABLES[str_format] = table
+    return table
+
+
+class BatchFormatter:
+    """
+    Formats a block of timestamps into every date format a generator needs. Each distinct day is
+    formatted once per block and the time of day is looked up in a table of the 86400 seconds of a
+    day, so the per timestamp work is one array lookup and one string concatenation
+    """
+
+    def __init__(self, formats):
+        """
+        Instance initialisation
+        :param formats: dict of name -> strftime format or EPOCH
+        """
+        self.formats = formats
+        self._parts = {name: None if str_format == EPOCH else split_format(str_format)
+                       for name, str_format in formats.items()}
+
+    def format(self, block, utc_offset=0):
+        """
+        Format a block of timestamps
+        :param block: numpy int64 array of microseconds since epoch
+        :param utc_offset: microseconds the block is ahead of UTC, for blocks of local wall clock time. Only
+        EPOCH columns change, the others show the block as it is
+        :return: dict of name -> list of strings
+        """
+        seconds = block // 1000000
+        days = seconds // _SECONDS_PER_DAY
+        time_of_day = seconds - days * _SECONDS_PER_DAY
+        unique_days, day_index = np.unique(days, return_inverse=True)
+        dates = [_UNIX + datetime.timedelta(days=int(day)) for day in unique_days]
+
+        formatted = {}
+        for name, str_format in self.formats.items():
+            parts = self._parts[name]
+            if str_format == EPOCH:
+                # int() of the float timestamp like to_timestamp does, which rounds towards zero
+                utc = block - utc_offset if utc_offset else block
+                epoch = np.where(utc < 0, -(-utc // 1000000), utc // 1000000)
+                formatted[name] = list(map(str, epoch.tolist()))
+            elif parts is None:
+                formatted[name] = [(_UNIX + datetime.timedelta(microseconds=int(stamp))).strftime(str_format)
+                                   for stamp in block]
+            else:
+                day_format, time_format = parts
+                day_strings = np.array([date.strftime(day_format) for date in dates], dtype=object)[day_index]
+                if time_format:
+                    day_strings = day_strings + get_time_table(time_format)[time_of_day]
+                formatted[name] = day_strings.tolist()
+        return formatted
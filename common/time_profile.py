@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Shapes of the between dates time series: day/night cycle, quiet weekends, busy business hours and bursts
+"""
+
+import math
+from functools import lru_cache
+
+from common.config_reader import config
+from common import seeding
+
+# numpy is imported where it is used, the command line parsers import this module for SHAPES
+
+SHAPES = ('diurnal', 'weekly', 'business', 'burst')
+
+# The window is cut in bins of this many seconds, the rate of logs is the same all through a bin
+BIN_SECONDS = 300
+# Longer windows get wider bins so no more than this many are kept
+MAX_BINS = 1 << 20
+
+_MICROSECONDS = 1000000
+_DAY = 86400
+# 1970-01-01 was a Thursday, weekday() 3
+_EPOCH_WEEKDAY = 3
+
+
+def parse_shapes(spec):
+    """
+    Shapes from their command line form, diurnal,weekly,burst
+    :param spec: comma separated shapes, uniform or empty for none
+    :return: tuple of shapes
+    """
+    shapes = tuple(shape.strip() for shape in (spec or '').split(',') if shape.strip() and shape.strip() != 'uniform')
+    for shape in shapes:
+        if shape not in SHAPES:
+            raise ValueError("Unknown time profile %s, use uniform or some of %s" % (shape, ', '.join(SHAPES)))
+    return shapes
+
+
+class TimeProfile:
+    """
+    A rate of logs over a window from start to end, as the product of the shapes asked for. The n-th of
+    count logs is put where the cumulative rate reaches n / (count - 1), so timestamps come out in order,
+    any index is placed without the ones before it, and a uniform rate gives the evenly spaced series
+    """
+
+    def __init__(self, start, end, shapes, diurnal_swing=0.6, peak_hour=14, weekend_factor=0.3, business_start=8,
+                 business_end=18, business_factor=3.0, bursts_per_day=1.0, burst_minutes=10, burst_factor=20.0,
+                 seed=None):
+        """
+        Instance initialisation
+        :param start: microseconds since epoch of the first log
+        :param end: microseconds since epoch of the last log
+        :param shapes: some of SHAPES
+        :param diurnal_swing: diurnal, how far the rate swings around its mean, 0 to 1
+        :param peak_hour: diurnal, busiest hour of the day
+        :param weekend_factor: weekly, rate of saturdays and sundays against week days
+        :param business_start: business, first hour of business
+        :param business_end: business, hour business ends
+        :param business_factor: business, rate of business hours of week days against the other hours
+        :param bursts_per_day: burst, average number of bursts a day, placed at random
+        :param burst_minutes: burst, length of a burst
+        :param burst_factor: burst, rate during a burst against the rate around it
+        :param seed: seed of the burst placement
+        """
+        import numpy as np
+
+        self.start = start
+        self.duration = max(end - start, 0)
+        self.shapes = tuple(shapes)
+        self.bin = max(BIN_SECONDS * _MICROSECONDS, -(-self.duration // MAX_BINS))
+        bins = max(-(-self.duration // self.bin), 1)
+        # bin edges as microseconds from start, the last one is the end
+        self.edges = np.minimum(np.arange(bins + 1, dtype=np.int64) * self.bin, self.duration)
+        # seconds since epoch of every bin's middle
+        seconds = (start + (self.edges[:-1] + self.edges[1:]) // 2) // _MICROSECONDS
+        hours = (seconds % _DAY) / 3600.0
+        week_days = (seconds // _DAY + _EPOCH_WEEKDAY) % 7 < 5
+
+        rate = np.ones(bins)
+        if 'diurnal' in shapes:
+            rate *= 1 + diurnal_swing * np.cos(2 * math.pi * (hours - peak_hour) / 24)
+        if 'weekly' in shapes:
+            rate *= np.where(week_days, 1.0, weekend_factor)
+        if 'business' in shapes:
+            rate *= np.where(week_days & (hours >= business_start) & (hours < business_end), business_factor, 1.0)
+        self.bursts = None
+        if 'burst' in shapes:
+            random = np.random.default_rng(seed)
+            length = max(int(math.ceil(burst_minutes * 60 * _MICROSECONDS / self.bin)), 1)
+            starts = random.integers(0, bins, random.poisson(bursts_per_day * self.duration / _DAY / _MICROSECONDS))
+            self.bursts = np.zeros(bins, dtype=bool)
+            for first in starts.tolist():
+                self.bursts[first:first + length] = True
+            rate *= np.where(self.bursts, burst_factor, 1.0)
+
+        weights = rate * np.diff(self.edges)
+        self.cdf = np.concatenate(([0.0], np.cumsum(weights)))
+        if self.cdf[-1] > 0:
+            self.cdf /= self.cdf[-1]
+        else:
+            self.cdf = np.linspace(0, 1, bins + 1)
+
+    def offsets(self, fractions):
+        """
+        Where logs go in the window
+        :param fractions: numpy array of positions in the series, 0 for the first log and 1 for the last
+        :return: numpy int64 microseconds from start
+        """
+        import numpy as np
+        return np.interp(fractions, self.cdf, self.edges).astype(np.int64)
+
+    def fraction(self, stamp):
+        """
+        Position in the series of a moment, the inverse of offsets
+        :param stamp: microseconds since epoch
+        :return: 0 to 1
+        """
+        import numpy as np
+        return float(np.interp(stamp - self.start, self.edges, self.cdf))
+
+    def in_burst(self, block):
+        """
+        Which timestamps fall in a burst
+        :param block: numpy int64 microseconds since epoch
+        :return: numpy bool array, None without bursts
+        """
+        import numpy as np
+        if self.bursts is None:
+            return None
+        bins = np.clip((block - self.start) // self.bin, 0, len(self.bursts) - 1)
+        return self.bursts[bins]
+
+
+@lru_cache(maxsize=8)
+def _load(start, end, shapes, seed):
+    read = config.read
+    return TimeProfile(start, end, shapes, diurnal_swing=float(read('time_profile', 'diurnal_swing')),
+                       peak_hour=float(read('time_profile', 'peak_hour')),
+                       weekend_factor=float(read('time_profile', 'weekend_factor')),
+                       business_start=float(read('time_profile', 'business_start')),
+                       business_end=float(read('time_profile', 'business_end')),
+                       business_factor=float(read('time_profile', 'business_factor')),
+                       bursts_per_day=float(read('time_profile', 'bursts_per_day')),
+                       burst_minutes=float(read('time_profile', 'burst_minutes')),
+                       burst_factor=float(read('time_profile', 'burst_factor')), seed=seed)
+
+
+def get_time_profile(start, end, shapes):
+    """
+    Profile of a window with the settings of the [time_profile] section of setup.cfg, made once per
+    process. Bursts are placed from the run seed, or the same way every run without one so that every
+    worker and every generator of a run sees the same bursts
+    :param start: microseconds since epoch
+    :param end: microseconds since epoch
+    :param shapes: some of SHAPES
+    :return: TimeProfile, None without shapes
+    """
+    if not shapes:
+        return None
+    seed = seeding.derive(seeding.TIMES)
+    return _load(start, end, tuple(shapes), 0 if seed is None else seed)
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Time series of log timestamps generated lazily in fixed size blocks
+"""
+
+import datetime
+
+import numpy as np
+
+# Timestamps materialised at once. A block of logs is generated per chunk, so it is kept
+# small enough for a block of the longest (aws) logs to stay around 10 MiB
+DEFAULT_CHUNK_SIZE = 8 * 1024
+
+_UNIX = datetime.datetime(1970, 1, 1)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+def to_microseconds(value):
+    """
+    Microseconds since epoch of a date, like pd.Timestamp(value).value // 1000. ISO dates are parsed
+    without pandas, which is only imported for the other forms it understands
+    :param value: str, datetime or anything pd.Timestamp takes
+    :return: int
+    """
+    if isinstance(value, str):
+        try:
+            value = datetime.datetime.fromisoformat(value)
+        except ValueError:
+            import pandas as pd
+            return pd.Timestamp(value).value // 1000
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return (value - _UNIX) // _MICROSECOND
+    import pandas as pd
+    return pd.Timestamp(value).value // 1000
+
+
+class TimeSeries:
+    """
+    count timestamps evenly spaced from start to end (both included) like pd.date_range(start, end, periods=count),
+    or spread following a TimeProfile, without ever holding more than chunk_size of them in memory
+    """
+
+    def __init__(self, start, end, count, first=0, last=None, chunk_size=DEFAULT_CHUNK_SIZE, profile=None):
+        """
+        Instance initialisation
+        :param start: first timestamp
+        :param end: last timestamp
+        :param count: number of timestamps in the whole series
+        :param first: index of the first timestamp to produce
+        :param last: index after the last timestamp to produce, defaults to count
+        :param chunk_size: timestamps per block
+        :param profile: function of (start, end) microseconds giving the TimeProfile to follow, or None
+        """
+        self.count = count
+        self.first = first
+        self.last = count if last is None else last
+        self.chunk_size = chunk_size
+        # microseconds, datetime has no nanoseconds to format
+        self._start = to_microseconds(start)
+        end = to_microseconds(end)
+        self._step = (end - self._start) / (count - 1) if count > 1 else 0
+        self.profile = profile(self._start, end) if profile is not None else None
+
+    def __len__(self):
+        return max(self.last - self.first, 0)
+
+    def get_block(self, first, last):
+        """
+        Timestamps from index first up to last as int64 microseconds since epoch
+        :param first:
+        :param last:
+        :return: numpy array
+        """
+        if self.profile is not None:
+            fractions = np.arange(first, last) / (self.count - 1) if self.count > 1 else np.zeros(last - first)
+            return self._start + self.profile.offsets(fractions)
+        return self._start + (np.arange(first, last) * self._step).astype(np.int64)
+
+    def bursts(self, block):
+        """
+        Which timestamps of a block fall in a burst of the profile
+        :param block: numpy int64 microseconds
+        :return: numpy bool array, None when there are no bursts
+        """
+        return self.profile.in_burst(block) if self.profile is not None else None
+
+    def index_of(self, date):
+        """
+        Index of the first timestamp at or after a date
+        :param date: anything to_microseconds takes
+        :return: int between 0 and count
+        """
+        stamp = to_microseconds(date)
+        if stamp <= self._start:
+            return 0
+        if not self._step:
+            return self.count
+        if self.profile is not None:
+            index = min(max(int(self.profile.fraction(stamp) * (self.count - 1)), 0), self.count)
+        else:
+            index = min(max(int((stamp - self._start) // self._step), 0), self.count)
+        while index > 0 and self.get_block(index - 1, index)[0] >= stamp:
+            index -= 1
+        while index < self.count and self.get_block(index, index + 1)[0] < stamp:
+            index += 1
+        return index
+
+    def numbered_blocks(self, whole=False):
+        """
+        Iterate the series in blocks aligned on multiples of chunk_size, so block n always covers the
+        same timestamps whatever part of the series is produced
+        :param whole: start the first block at its aligned start even when first is past it
+        :return: generator of (block number, timestamps to skip at the start, numpy array)
+        """
+        for start in range(self.first - self.first % self.chunk_size, self.last, self.chunk_size):
+            first = start if whole else max(start, self.first)
+            yield start // self.chunk_size, max(self.first - first, 0), self.get_block(
+                first, min(start + self.chunk_size, self.last))
+
+    def blocks(self):
+        """
+        Iterate the series as numpy arrays of int64 microseconds, chunk_size at a time
+        :return:
+        """
+        for _, _, block in self.numbered_blocks():
+            yield block
+
+    def chunks(self):
+        """
+        Iterate the series as DatetimeIndex blocks, chunk_size at a time, needs pandas
+        :return:
+        """
+        import pandas as pd
+        for block in self.blocks():
+            yield pd.to_datetime(block, unit='us')
+
+    def __iter__(self):
+        for chunk in self.chunks():
+            yield from chunk
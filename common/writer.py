@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Buffered log file writer used by the between dates (backfill) mode
+"""
+
+import os
+import sys
+
+from common.compression import EXTENSIONS, get_compressor
+
+# Write out every 256 KiB of logs, larger chunks stop fitting in cache and get slower
+DEFAULT_BUFFER_SIZE = 256 * 1024
+
+
+class LogWriter:
+    """
+    A class to collect log lines in memory and write them out encoded in large chunks
+    """
+
+    def __init__(self, path, buffer_size=DEFAULT_BUFFER_SIZE, echo=False, compression=None, level=None,
+                 append=False):
+        """
+        Instance initialisation
+        :param path: log file to write, the compression extension is added to it
+        :param buffer_size: characters to collect before every write
+        :param echo: also print every log line to stdout
+        :param compression: gzip, zstd, lz4 or None, every chunk is written as its own compressed member
+        :param level: compression level
+        :param append: add to the end of an existing file instead of starting it over
+        """
+        self.path = path + EXTENSIONS[compression]
+        self._compress = get_compressor(compression, level)
+        self.buffer_size = buffer_size
+        self.echo = echo
+        self.lines = 0
+        self.bytes = 0
+        self._pending = []
+        self._size = 0
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | (os.O_APPEND if append else os.O_TRUNC), 0o644)
+
+    def write(self, log):
+        """
+        Add one log line, without line break
+        :param log:
+        :return:
+        """
+        self._pending.append(log)
+        self._size += len(log)
+        if self._size >= self.buffer_size:
+            self.flush()
+
+    def write_many(self, logs):
+        """
+        Add a list of log lines, without line breaks
+        :param logs:
+        :return:
+        """
+        pending = self._pending
+        for log in logs:
+            pending.append(log)
+            self._size += len(log)
+            if self._size >= self.buffer_size:
+                self.flush()
+
+    def write_block(self, block, logs):
+        """
+        Add the logs of a block of timestamps, see PartitionedWriter
+        :param block: timestamps of the logs
+        :param logs:
+        :return:
+        """
+        self.write_many(logs)
+
+    def flush(self):
+        """
+        Join, encode and write everything collected so far in one go
+        :return:
+        """
+        if not self._pending:
+            return
+        self._pending.append('')
+        text = '\n'.join(self._pending)
+        if self.echo:
+            sys.stdout.write(text)
+        self.lines += len(self._pending) - 1
+        self._pending.clear()
+        self._size = 0
+        data = text.encode('utf-8')
+        if self._compress is not None:
+            data = self._compress(data)
+        self._write(data)
+
+    def _write(self, data):
+        """
+        Write all of data to the file
+        :param data: bytes
+        :return:
+        """
+        with memoryview(data) as view:
+            written = 0
+            while written < len(view):
+                written += os.write(self._fd, view[written:])
+        self.bytes += len(data)
+
+    def close(self):
+        """
+        Flush and close the file
+        :return:
+        """
+        if self._fd is not None:
+            self.flush()
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,69 @@
+"""
+Realtime logs of several generators from one process, interleaved by weight and sent to several
+destinations, run `python log_faker.py --help`
+"""
+import argparse
+
+from common.config_reader import ConfigReader
+from common.rate import PROFILES
+from common.registry import GENERATORS, load_generator
+
+
+def get_default_destination():
+    """
+    The syslog collector in setup.cfg
+    :return: transport://host:port
+    """
+    read = ConfigReader().read
+    return '%s://%s:%s' % (read('syslog', 'type').lower(), read('syslog', 'host'), read('syslog', 'port'))
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Log faker running several generators in one event loop')
+    parser.add_argument('-g', '--generators', type=str, help='Comma separated generators to run, evenly mixed',
+                        default=','.join(GENERATORS))
+    parser.add_argument('--mix', type=str, help='Generators and their share of the logs with --eps, e.g. aws=40,'
+                                                'fortigate=30,sonicwall=30, replaces --generators')
+    parser.add_argument('-d', '--dest', action='append',
+                        help='Where logs go, repeat for several: udp://host:port, tcp://host:port, tls://host:port, '
+                             'a file (compressed when ending in .gz, .zst or .lz4) or - for stdout, '
+                             'default the syslog collector in setup.cfg')
+    parser.add_argument('--eps', type=float,
+                        help='Target logs per second of the whole mix, default every generator one log at a time '
+                             'at its own pace')
+    parser.add_argument('--burst', type=int, help='Most logs sent at once to catch up, default one second worth')
+    parser.add_argument('--profile', type=str, choices=PROFILES, help='Arrival profile with --eps', default='constant')
+    parser.add_argument('--geoip', action='store_true', help='Append the GeoLite location of the source ip to every log')
+    parser.add_argument('--queue-size', type=int, help='Batches queued per destination before dropping, default 1024')
+    parser.add_argument('--block', action='store_true',
+                        help='Slow down the generators instead of dropping when a destination falls behind')
+    parser.add_argument('--duration', type=float, help='Seconds to run, default forever')
+    parser.add_argument('--seed', type=int, help='Seed of the users, ips and samples picked')
+    parser.add_argument('--stats-interval', type=float, default=10,
+                        help='Seconds between two reports of the destinations and stats on stderr, 0 for none, '
+                             'default 10')
+    parser.add_argument('--metrics-port', type=int,
+                        help='Serve the metrics for Prometheus at http://127.0.0.1:PORT/metrics')
+    args = parser.parse_args()
+    if args.mix and not args.eps:
+        # without a rate of their own the generators run at their own paces and the shares mean nothing
+        parser.error('--mix needs --eps')
+
+    # the engine needs asyncio and numpy, which are slow to import for --help
+    from common.engine import Engine, parse_destination, DEFAULT_QUEUE_SIZE
+    from common.mix import MixedGenerator, parse_mix
+    try:
+        mix = parse_mix(args.mix or args.generators)
+    except ValueError as error:
+        parser.error(str(error))
+    generators = [load_generator(name, locate=args.geoip, seed=args.seed) for name in mix]
+    if args.eps:
+        generators = [MixedGenerator(generators, list(mix.values()), args.eps, burst=args.burst,
+                                     profile=args.profile)]
+    destinations = [parse_destination(spec, queue_size=args.queue_size or DEFAULT_QUEUE_SIZE, block=args.block)
+                    for spec in args.dest or [get_default_destination()]]
+    if args.metrics_port is not None:
+        from common.metrics import start_reporting
+        start_reporting(port=args.metrics_port)
+    Engine(generators, destinations, report_interval=args.stats_interval).start(args.duration)
@@ -0,0 +1,46 @@
+"""
+Replay of a spool written between dates with --spool to the syslog collector in setup.cfg, run
+`python replay.py --help`
+"""
+import argparse
+
+from common.config_reader import ConfigReader
+from common.rate import PROFILES
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Send the logs of a spool to syslog at a target rate')
+    parser.add_argument('spool', type=str, help='Spool written by a generator or backfill.py with --spool, '
+                                                'e.g. destination/aws.spool')
+    parser.add_argument('--eps', type=float, help='Target logs per second, default as fast as the collector takes them')
+    parser.add_argument('--burst', type=int, help='Most logs sent at once to catch up, default one second worth')
+    parser.add_argument('--profile', type=str, choices=PROFILES, help='Arrival profile with --eps', default='constant')
+    parser.add_argument('-c', '--count', type=int, help='Logs to send, default the whole spool or forever with --loop')
+    parser.add_argument('--loop', action='store_true', help='Start the spool over once it is all sent')
+    parser.add_argument('--rewrite-time', action='store_true',
+                        help='Put the current time in the syslog header timestamp of every log, the rest of the '
+                             'log is sent as it was spooled')
+    parser.add_argument('--batch-size', type=int,
+                        help='Syslog messages sent per system call, default batch_size in setup.cfg')
+    parser.add_argument('--stats-interval', type=float, default=10,
+                        help='Seconds between two stats lines on stderr, 0 for none, default 10')
+    parser.add_argument('--metrics-port', type=int,
+                        help='Serve the metrics for Prometheus at http://127.0.0.1:PORT/metrics')
+    args = parser.parse_args()
+
+    # numpy is slow to import for --help
+    from common.metrics import start_reporting, watch_sender
+    from common.sender import open_syslog_sender
+    from common.spool import Spool, replay
+
+    sender, destination = open_syslog_sender(ConfigReader().read, args.batch_size)
+    watch_sender(sender, destination)
+    start_reporting(args.stats_interval, args.metrics_port)
+    with Spool(args.spool) as spool:
+        try:
+            replay(spool, sender, eps=args.eps, burst=args.burst, profile=args.profile, count=args.count,
+                   loop=args.loop, rewrite=args.rewrite_time)
+        except KeyboardInterrupt:
+            pass
+    sender.close()
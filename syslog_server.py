@@ -0,0 +1,166 @@
+"""
+Loopback syslog collector to check the senders, run `python syslog_server.py --help`
+"""
+import ssl
+import socket
+import sys
+import time
+import argparse
+import threading
+import socketserver
+
+# Receive buffer of the UDP server, so bursts are not dropped while a message is being counted
+UDP_RECEIVE_BUFFER = 16 * 1024 * 1024
+
+
+class UDPServer(socketserver.UDPServer):
+    """
+    One thread reading every datagram, with a large receive buffer
+    """
+
+    def server_bind(self):
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UDP_RECEIVE_BUFFER)
+        super().server_bind()
+
+
+def read_frames(stream):
+    """
+    Messages of a TCP syslog stream. Every frame is read as RFC 6587 octet counting when it starts with
+    a digit and as a newline ended message otherwise
+    :param stream: binary file of the connection
+    :return: generator of bytes
+    """
+    while True:
+        first = stream.read(1)
+        if not first:
+            return
+        if first.isdigit():
+            length = first
+            while True:
+                char = stream.read(1)
+                if not char:
+                    return
+                if char == b' ':
+                    break
+                length += char
+            message = stream.read(int(length))
+            if len(message) < int(length):
+                return
+            yield message
+        else:
+            line = first + stream.readline()
+            yield line.rstrip(b'\n')
+
+
+class LoopbackServer:
+    """
+    UDP, TCP or TLS syslog server counting the messages it receives, in a thread
+    """
+
+    def __init__(self, transport='UDP', host='127.0.0.1', port=0, certfile=None, keyfile=None, echo=False):
+        """
+        Instance initialisation
+        :param transport: UDP, TCP or TLS
+        :param host:
+        :param port: 0 to pick a free one
+        :param certfile: TLS server certificate
+        :param keyfile: TLS server key
+        :param echo: print every message
+        """
+        self.transport = transport.upper()
+        self.echo = echo
+        self.received = 0
+        self.bytes = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class UDPHandler(socketserver.BaseRequestHandler):
+            def handle(self):
+                server.count(self.request[0])
+
+        class StreamHandler(socketserver.StreamRequestHandler):
+            def setup(self):
+                if server.transport == 'TLS':
+                    self.request = context.wrap_socket(self.request, server_side=True)
+                super().setup()
+
+            def handle(self):
+                with server._lock:
+                    server.connections += 1
+                for message in read_frames(self.rfile):
+                    server.count(message)
+
+        if self.transport == 'UDP':
+            self._server = UDPServer((host, port), UDPHandler)
+        else:
+            if self.transport == 'TLS':
+                context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+                context.load_cert_chain(certfile, keyfile)
+            self._server = socketserver.ThreadingTCPServer((host, port), StreamHandler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+
+    def count(self, message):
+        """
+        Account one received message
+        :param message: bytes
+        :return:
+        """
+        with self._lock:
+            self.received += 1
+            self.bytes += len(message)
+        if self.echo:
+            print(message.decode('utf-8', 'replace'))
+
+    def start(self):
+        """
+        Serve in a background thread
+        :return: self
+        """
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def wait(self, count, timeout=2):
+        """
+        Wait until count messages came in or nothing came for timeout seconds
+        :param count:
+        :param timeout:
+        :return: messages received
+        """
+        last, idle = self.received, time.monotonic()
+        while self.received < count and time.monotonic() - idle < timeout:
+            time.sleep(0.05)
+            if self.received != last:
+                last, idle = self.received, time.monotonic()
+        return self.received
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Loopback syslog server printing what it receives per second')
+    parser.add_argument('-t', '--transport', type=str.upper, choices=['UDP', 'TCP', 'TLS'], default='UDP')
+    parser.add_argument('--host', type=str, help='Address to listen on', default='127.0.0.1')
+    parser.add_argument('-p', '--port', type=int, help='Port to listen on', default=5144)
+    parser.add_argument('--certfile', type=str, help='TLS certificate')
+    parser.add_argument('--keyfile', type=str, help='TLS key')
+    parser.add_argument('--echo', action='store_true', help='Print every message')
+    args = parser.parse_args()
+
+    if args.transport == 'TLS' and not args.certfile:
+        parser.error('TLS needs --certfile')
+    loopback = LoopbackServer(args.transport, args.host, args.port, args.certfile, args.keyfile, args.echo).start()
+    reported = 0
+    try:
+        while True:
+            time.sleep(1)
+            received = loopback.received
+            sys.stderr.write('%d msg/s, %d messages, %d bytes, %d connections\n' % (
+                received - reported, received, loopback.bytes, loopback.connections))
+            reported = received
+    except KeyboardInterrupt:
+        loopback.close()
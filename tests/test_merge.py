@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+k-way merge of the between dates blocks of several generators
+"""
+
+import numpy as np
+
+from common.merge import merge_blocks, split_count
+
+
+def blocks(stamps, name, size):
+    """
+    A source cut in blocks like BaseLogGenerator.create_blocks gives them
+    :param stamps: timestamps in order
+    :param name: put in every log to tell the sources apart
+    :param size: timestamps per block
+    :return: generator of (numpy int64 timestamps, list of logs)
+    """
+    for start in range(0, len(stamps), size):
+        block = np.array(stamps[start:start + size], dtype=np.int64)
+        yield block, ['%s %d %d' % (name, stamp, start + index) for index, stamp in enumerate(block.tolist())]
+
+
+def merge(sources):
+    """
+    Every merged block joined
+    :param sources: see merge_blocks
+    :return: timestamps, logs, source of every log
+    """
+    stamps, logs, origins = [], [], []
+    for block, lines, kinds in merge_blocks(sources):
+        assert len(block) == len(lines) == len(kinds)
+        stamps.extend(block.tolist())
+        logs.extend(lines)
+        origins.extend(kinds.tolist())
+    return stamps, logs, origins
+
+
+def test_merged_in_time_order():
+    rng = np.random.default_rng(5)
+    series = [np.sort(rng.integers(0, 10 ** 6, size)).tolist() for size in (5000, 1200, 3300)]
+    stamps, logs, origins = merge([blocks(stamps, str(number), size)
+                                   for number, (stamps, size) in enumerate(zip(series, (512, 100, 4096)))])
+    assert stamps == sorted(stamps)
+    assert [int(log.split()[1]) for log in logs] == stamps
+    assert origins == [int(log.split()[0]) for log in logs]
+    # every source keeps its own order
+    for number, source in enumerate(series):
+        assert [int(log.split()[2]) for log in logs if log.startswith('%d ' % number)] == list(range(len(source)))
+
+
+def test_equal_timestamps():
+    stamps, logs, _ = merge([blocks([1, 2, 2, 3], 'a', 2), blocks([2, 2, 3], 'b', 1)])
+    assert stamps == [1, 2, 2, 2, 2, 3, 3]
+    assert [log for log in logs if log.startswith('a')] == ['a 1 0', 'a 2 1', 'a 2 2', 'a 3 3']
+    assert [log for log in logs if log.startswith('b')] == ['b 2 0', 'b 2 1', 'b 3 2']
+
+
+def test_empty_and_exhausted_sources():
+    stamps, logs, origins = merge([blocks([], 'a', 4), iter([(np.empty(0, dtype=np.int64), [])]),
+                                   blocks([7, 8], 'c', 4)])
+    assert stamps == [7, 8]
+    assert origins == [2, 2]
+
+
+def test_split_count():
+    assert split_count(10, [40, 30, 30]) == [4, 3, 3]
+    assert split_count(7, [1, 1, 1]) == [3, 2, 2]
+    assert sum(split_count(1000001, [3, 5, 11])) == 1000001
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Seeded between dates runs give the same logs whatever the number of workers, and --part gives a slice of them
+"""
+
+import os
+import sys
+import subprocess
+
+import pytest
+
+from common.cli import get_parser, get_options
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+OPTIONS = ['-m', 'between', '-s', '2020-01-01', '-e', '2020-01-03', '-c', '20000', '-z', 'none', '-q',
+           '--seed', '3']
+
+
+def generate(module, outdir, filename, *options):
+    """
+    Run a generator module between dates
+    :param module: e.g. fortigate
+    :param outdir:
+    :param filename:
+    :param options: more command line options
+    :return: bytes of the log file
+    """
+    subprocess.run([sys.executable, module + '.py', '-o', str(outdir), '-n', filename] + OPTIONS + list(options),
+                   cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+    with open(os.path.join(str(outdir), filename), 'rb') as log_file:
+        return log_file.read()
+
+
+@pytest.mark.parametrize('module', ['fortigate', 'aws', 'sonicwall'])
+def test_workers_do_not_change_logs(module, tmp_path):
+    single = generate(module, tmp_path, 'single.log', '-w', '1')
+    assert single.count(b'\n') == 20000
+    assert generate(module, tmp_path, 'sharded.log', '-w', '3') == single
+
+
+def test_seed_changes_logs(tmp_path):
+    assert generate('fortigate', tmp_path, 'a.log') != generate('fortigate', tmp_path, 'b.log', '--seed', '4')
+
+
+def test_part_is_a_slice_of_full_run(tmp_path):
+    from fortigate import FortigateLogGenerator
+
+    part = ['2020-01-01 17:30', '2020-01-02 06:00']
+    full = generate('fortigate', tmp_path, 'full.log').splitlines(True)
+    sliced = generate('fortigate', tmp_path, 'part.log', '--part', *part).splitlines(True)
+    args = get_parser('fortigate', filename='full.log').parse_args(OPTIONS + ['-o', str(tmp_path)])
+    series = FortigateLogGenerator(**get_options(args)).get_time_series()
+    first, last = series.index_of(part[0]), series.index_of(part[1])
+    assert 0 < first < last < len(full)
+    assert sliced == full[first:last]
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Spools give back the logs written to them, with the current time in their header when replayed live
+"""
+
+import os
+import sys
+import datetime
+import subprocess
+
+import numpy as np
+import pytest
+
+from common.spool import SpoolWriter, Spool, build_index, merge_spools, replay, get_spool_path, INDEX_EXTENSION
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEADERS = [(0, '%b %d %H:%M:%S'), (6, '%Y-%m-%dT%H:%M:%SZ'), None]
+NAMES = ['fortigate', 'checkpoint', 'raw']
+LOGS = [
+    'Jan 01 00:00:01 10.1.1.1 date=2020-01-01 time=00:00:01 action="deny"',
+    'time: 2020-01-01T00:00:02Z product: VPN-1 & FireWall-1 action: Drop src: 81.2.69.142',
+    'no header here, été',
+    'Jan 01 00:00:03 10.1.1.1 date=2020-01-01 time=00:00:03 action="accept"',
+    '',
+    'short',
+]
+KINDS = np.array([0, 1, 2, 0, 2, 0], dtype=np.uint8)
+
+
+class ListSender:
+    """
+    Sender keeping everything it is given
+    """
+
+    def __init__(self):
+        self.payloads = []
+
+    def send_payloads(self, payloads):
+        self.payloads.extend(payloads)
+
+
+def write_spool(path, blocks=2):
+    """
+    A spool holding LOGS once per block
+    :param path:
+    :param blocks:
+    :return: path
+    """
+    with SpoolWriter(path, HEADERS, NAMES, buffer_size=64) as writer:
+        for _ in range(blocks):
+            writer.write_block(None, LOGS, KINDS)
+    return path
+
+
+def test_round_trip(tmp_path):
+    path = write_spool(str(tmp_path / 'a.spool'))
+    with Spool(path) as spool:
+        assert len(spool) == 2 * len(LOGS)
+        assert spool.names == NAMES
+        assert spool.headers == HEADERS
+        assert spool.index['kind'].tolist() == KINDS.tolist() * 2
+        assert [payload.decode('utf-8') for payload in spool.payloads(0, len(spool))] == LOGS * 2
+
+
+def test_header_rewrite(tmp_path):
+    now = datetime.datetime(2021, 6, 5, 4, 3, 2)
+    with Spool(write_spool(str(tmp_path / 'a.spool'), blocks=1)) as spool:
+        payloads = [payload.decode('utf-8') for payload in spool.payloads(0, len(spool), now)]
+    assert payloads == [
+        'Jun 05 04:03:02 10.1.1.1 date=2020-01-01 time=00:00:01 action="deny"',
+        'time: 2021-06-05T04:03:02Z product: VPN-1 & FireWall-1 action: Drop src: 81.2.69.142',
+        'no header here, été',
+        'Jun 05 04:03:02 10.1.1.1 date=2020-01-01 time=00:00:03 action="accept"',
+        '',
+        'short',
+    ]
+
+
+def test_missing_index_is_rebuilt(tmp_path):
+    path = write_spool(str(tmp_path / 'a.spool'))
+    os.remove(path + INDEX_EXTENSION)
+    assert build_index(path) == 2 * len(LOGS)
+    with Spool(path) as spool:
+        assert [payload.decode('utf-8') for payload in spool.payloads(0, len(spool))] == LOGS * 2
+
+
+def test_merge_spools(tmp_path):
+    parts = [write_spool(str(tmp_path / ('part%d.spool' % number)), blocks=number + 1) for number in range(3)]
+    with Spool(merge_spools(parts, str(tmp_path / 'merged.spool'))) as spool:
+        assert [payload.decode('utf-8') for payload in spool.payloads(0, len(spool))] == LOGS * 6
+        assert spool.index['kind'].tolist() == KINDS.tolist() * 6
+
+
+@pytest.mark.parametrize('loop', [False, True])
+def test_replay(tmp_path, loop):
+    sender = ListSender()
+    with Spool(write_spool(str(tmp_path / 'a.spool'))) as spool:
+        sent = replay(spool, sender, count=15 if loop else None, loop=loop, chunk=4)
+    assert sent == len(sender.payloads) == (15 if loop else 12)
+    assert [payload.decode('utf-8') for payload in sender.payloads] == (LOGS * 3)[:sent]
+
+
+def test_generator_spool_holds_its_logs(tmp_path):
+    options = ['-m', 'between', '-s', '2020-01-01', '-e', '2020-01-02', '-c', '20000', '-z', 'none', '-q',
+               '--seed', '5', '-o', str(tmp_path)]
+    for filename, more in (('plain.log', ['-w', '1']), ('spooled.log', ['-w', '3', '--spool'])):
+        subprocess.run([sys.executable, 'fortigate.py', '-n', filename] + options + more, cwd=ROOT, check=True,
+                       stdout=subprocess.DEVNULL)
+    with open(str(tmp_path / 'plain.log'), 'rb') as log_file:
+        logs = log_file.read().splitlines()
+    with Spool(get_spool_path(str(tmp_path / 'spooled.log'))) as spool:
+        assert spool.payloads(0, len(spool)) == logs
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Templates must render exactly what the chain of re.sub they replaced made
+"""
+
+import datetime
+
+import pytest
+
+from aws import AWSLogsGenerator
+from fortigate import FortigateLogGenerator
+from sonicwall import SonicwallLogGenerator
+from mssql import MSSQLLogGenerator
+from checkpoint import CheckpointLogGenerator
+from common.template import Rule, LogTemplate
+
+GENERATORS = [AWSLogsGenerator, FortigateLogGenerator, SonicwallLogGenerator, MSSQLLogGenerator,
+              CheckpointLogGenerator]
+
+DATE = datetime.datetime(2019, 7, 4, 9, 5, 3)
+
+
+def substitute(line, rules, values):
+    """
+    The old way: every rule is a re.sub over the whole line, in order
+    :param line:
+    :param rules: ordered list of Rule
+    :param values: dict of field name to value
+    :return: str
+    """
+    for rule in rules:
+        line = rule.pattern.sub(lambda match, new=rule.replacement.format(**values): new, line)
+    return line
+
+
+def get_values(generator, ip):
+    """
+    Values shaped like the real ones for every field of a generator's rules
+    :param generator: generator class
+    :param ip: address put in every ip field
+    :return: dict
+    """
+    values = {}
+    for name in {field for rule in generator._RULES for field in rule.fields}:
+        date_format = generator._DATE_FORMATS.get(name)
+        if date_format == 'epoch':
+            values[name] = str(int(DATE.timestamp()))
+        elif date_format:
+            values[name] = DATE.strftime(date_format)
+        elif 'ip' in name or name in ('src', 'dst'):
+            values[name] = ip
+        else:
+            values[name] = 'jdoe'
+    return values
+
+
+@pytest.mark.parametrize('generator', GENERATORS, ids=lambda generator: generator.__name__)
+@pytest.mark.parametrize('ip', ['81.2.69.142', '10.0.0.1'])
+def test_templates_match_re_sub_chain(generator, ip):
+    values = get_values(generator, ip)
+    assert generator._TEMPLATES
+    for template in generator._TEMPLATES:
+        assert template.render(values) == substitute(template.source, generator._RULES, values)
+
+
+def test_rules_apply_in_order():
+    rules = [Rule(r'\d+', '{number}'), Rule(r'b', '{letter}')]
+    values = {'number': '7', 'letter': 'x'}
+    template = LogTemplate('a1b22c', rules)
+    assert template.render(values) == substitute('a1b22c', rules, values) == 'a7x7c'
+    assert [name for _, name in template.slots] == ['number', 'letter', 'number']
@@ -1,27 +1,21 @@
-import os
-import random
 import datetime
-import pandas as pd
 
-import faker
-
-fake = faker.Faker()
+from common.identity import get_identity_pool
+from common.resource import get_store
 
+# Pseudo format for unix epoch seconds, see to_timestamp
+EPOCH = 'epoch'
 
 def get_ip_list():
     """
-    Picks up one random log from source file
-    :return:
+    Lines of the ip store, every generator gets the same store
+    :return: ResourceStore
     """
-    store_file = os.path.join(os.path.dirname(__file__) + '/resource/', 'ip_store.txt')
-    ip_list = open(store_file, 'r').readlines()
-    return ip_list
+    return get_store('ip_store.txt')
 
 
 def get_random_country():
-    index = random.randint(0, 5)
-    store_file = os.path.join(os.path.dirname(__file__) + '/resource/', 'country_store.txt')
-    return open(store_file, 'r').readlines()[index].strip('\n')
+    return get_store('country_store.txt').choice()
 
 
 def to_timestamp(timestamp):
@@ -30,9 +24,7 @@ def to_timestamp(timestamp):
 
 
 def to_datetime(timestamp, str_format):
-    if isinstance(timestamp, pd.Timestamp):
-        return timestamp.to_pydatetime().strftime(str_format)
-
+    # also pandas Timestamps, they are datetimes
     if isinstance(timestamp, datetime.datetime):
         return timestamp.strftime(str_format)
 
@@ -41,8 +33,8 @@ def to_datetime(timestamp, str_format):
 
 
 def get_random_username():
-    """ returns a random username """
-    return fake.profile(fields=['username'])['username']
+    """ returns a random username of the identity pool """
+    return get_identity_pool().choice()
 
 
 time_range = [1, 2, 3, 4, 5]